@@ -0,0 +1,180 @@
+from settings import *
+from support import convert_image, decode_images
+from os import walk, stat, makedirs
+from os.path import join, normpath
+import json
+
+class TextureAtlas:
+    '''
+    Класс TextureAtlas упаковывает кадры анимаций в несколько больших поверхностей (страниц)
+    и выдает кадры как подповерхности страниц. Готовый атлас сохраняется на диск (PNG-страницы и JSON-индекс),
+    поэтому при следующих запусках вместо сотни мелких файлов открываются только страницы.
+    '''
+    def __init__(self, pages, index):
+        '''
+        :param pages: Страницы атласа.
+        :type pages: list
+        :param index: Словарь путь к кадру -> [номер страницы, x, y, ширина, высота].
+        :type index: dict
+        '''
+        self.pages = pages
+        self.index = index
+        self.frames = {path: pages[page].subsurface(rect) for path, (page, *rect) in index.items()}
+        self.page_numbers = {page: number for number, page in enumerate(pages)}
+        self.flipped_pages = {} # номер страницы -> страница, отраженная по горизонтали
+
+    def __contains__(self, path):
+        return normpath(path) in self.frames
+
+    def __getitem__(self, path):
+        '''
+        Возвращает кадр по пути к исходному PNG-файлу.
+
+        :param path: Путь к изображению, например 'Assets/Slime/1.png'.
+        :type path: str
+        :rtype: pygame.Surface
+        '''
+        return self.frames[normpath(path)]
+
+    def flip(self, frame):
+        '''
+        Возвращает кадр, отраженный по горизонтали. Для кадров атласа отражается вся страница (один раз),
+        и отраженный кадр - это подповерхность отраженной страницы в зеркальной позиции.
+
+        :param frame: Кадр атласа или любая другая поверхность.
+        :type frame: pygame.Surface
+        :rtype: pygame.Surface
+        '''
+        page = frame.get_parent()
+        if page not in self.page_numbers:
+            return pygame.transform.flip(frame, True, False)
+        number = self.page_numbers[page]
+        if number not in self.flipped_pages:
+            self.flipped_pages[number] = pygame.transform.flip(page, True, False)
+        x, y = frame.get_offset()
+        width, height = frame.get_size()
+        return self.flipped_pages[number].subsurface((page.get_width() - x - width, y, width, height))
+
+    @staticmethod
+    def pack(sizes, page_size):
+        '''
+        Раскладывает прямоугольники по страницам полками: кадры сортируются по высоте и ставятся в ряд,
+        а когда ряд заполняется, начинается следующая полка.
+
+        :param sizes: Словарь ключ -> (ширина, высота).
+        :type sizes: dict
+        :param page_size: Размер квадратной страницы в пикселях.
+        :type page_size: int
+        :return: Словарь ключ -> [номер страницы, x, y, ширина, высота] и список размеров страниц.
+        :rtype: tuple
+        '''
+        places, page_sizes = {}, []
+        x = y = shelf_height = 0
+        for key, (width, height) in sorted(sizes.items(), key = lambda item: (-item[1][1], -item[1][0], item[0])):
+            if x + width > page_size:
+                x, y, shelf_height = 0, y + shelf_height, 0
+            if not page_sizes or y + height > page_size:
+                page_sizes.append([0, 0])
+                x = y = shelf_height = 0
+            places[key] = [len(page_sizes) - 1, x, y, width, height]
+            page_sizes[-1] = [max(page_sizes[-1][0], x + width), max(page_sizes[-1][1], y + height)]
+            x += width
+            shelf_height = max(shelf_height, height)
+        return places, page_sizes
+
+    @classmethod
+    def build(cls, paths, page_size = ATLAS_SIZE):
+        '''
+        Загружает изображения и упаковывает их в новый атлас.
+
+        :param paths: Пути к PNG-файлам.
+        :type paths: list
+        :param page_size: Размер страницы в пикселях.
+        :type page_size: int
+        :rtype: TextureAtlas
+        '''
+        images = dict(zip((normpath(path) for path in paths), decode_images(paths)))
+        index, page_sizes = cls.pack({path: image.get_size() for path, image in images.items()}, page_size)
+        pages = [pygame.Surface(size, pygame.SRCALPHA) for size in page_sizes]
+        for path, (page, x, y, width, height) in index.items():
+            pages[page].blit(images[path], (x, y))
+        return cls([convert_image(page) for page in pages], index)
+
+    @staticmethod
+    def sources(folder, exclude = ()):
+        '''
+        Возвращает пути ко всем PNG-файлам папки и ее подпапок, кроме исключенных подпапок.
+        '''
+        paths = []
+        for folder_path, sub_folders, image_names in walk(folder):
+            sub_folders[:] = sorted(sub_folder for sub_folder in sub_folders if sub_folder not in exclude)
+            paths += [join(folder_path, name) for name in sorted(image_names) if name.endswith('.png')]
+        return paths
+
+    @staticmethod
+    def signature(paths):
+        '''
+        Возвращает отпечаток исходников: время изменения и размер каждого файла.
+        '''
+        signature = {}
+        for path in paths:
+            info = stat(path)
+            signature[normpath(path).replace('\\', '/')] = [info.st_mtime, info.st_size]
+        return signature
+
+    def save(self, cache_folder, paths):
+        '''
+        Сохраняет страницы атласа в PNG и индекс в atlas.json.
+
+        :param cache_folder: Папка кеша.
+        :type cache_folder: str
+        :param paths: Исходные файлы, из которых собран атлас.
+        :type paths: list
+        '''
+        makedirs(cache_folder, exist_ok = True)
+        for number, page in enumerate(self.pages):
+            pygame.image.save(page, join(cache_folder, f'atlas_{number}.png'))
+        index = {path.replace('\\', '/'): place for path, place in self.index.items()}
+        with open(join(cache_folder, 'atlas.json'), 'w') as file:
+            json.dump({'pages': len(self.pages), 'sources': self.signature(paths), 'frames': index}, file)
+
+    @classmethod
+    def load(cls, cache_folder, paths):
+        '''
+        Загружает сохраненный атлас, если он собран из тех же, не изменившихся файлов.
+
+        :return: Атлас или None, если кеша нет или он устарел.
+        :rtype: TextureAtlas
+        '''
+        try:
+            with open(join(cache_folder, 'atlas.json')) as file:
+                data = json.load(file)
+            if data['sources'] != cls.signature(paths):
+                return None
+            # страницы атласа сами являются кешем, поэтому их пиксели не дублируются в кеше изображений
+            pages = [convert_image(page) for page in decode_images([join(cache_folder, f'atlas_{number}.png') for number in range(data['pages'])], None)]
+        except (OSError, ValueError, KeyError, pygame.error):
+            return None
+        return cls(pages, {normpath(path): place for path, place in data['frames'].items()})
+
+def load_atlas(folder, cache_folder, exclude = ()):
+    '''
+    Возвращает атлас всех PNG-файлов папки: из кеша, если он актуален, иначе собирает и сохраняет новый.
+
+    :param folder: Папка с изображениями, например 'Assets'.
+    :type folder: str
+    :param cache_folder: Папка, в которой хранится собранный атлас.
+    :type cache_folder: str
+    :param exclude: Имена подпапок, которые не попадают в атлас (например, тайлсеты уровней).
+    :type exclude: tuple
+    :rtype: TextureAtlas
+    '''
+    paths = TextureAtlas.sources(folder, exclude)
+    atlas = TextureAtlas.load(cache_folder, paths)
+    if atlas is None:
+        atlas = TextureAtlas.build(paths)
+        try:
+            atlas.save(cache_folder, paths)
+        except (OSError, pygame.error):
+            pass # без кеша атлас будет собираться при каждом запуске
+    return atlas
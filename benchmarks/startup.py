@@ -0,0 +1,62 @@
+'''
+Бенчмарк загрузки изображений при запуске игры.
+
+Сравнивает три способа получить все PNG из папки Assets в формате экрана:
+- cold: последовательная распаковка PNG без кеша (так игра загружалась раньше);
+- parallel: распаковка PNG в пуле потоков без кеша;
+- warm: чтение несжатых пикселей из кеша по хешу файла (последовательно и параллельно).
+
+Запуск из корня репозитория:
+    python benchmarks/startup.py [--repeat 5] [--json results.json]
+'''
+import os, sys
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(sys.path[0])
+
+from settings import *
+from support import decode_images, convert_image
+from tempfile import TemporaryDirectory
+from statistics import median
+from time import perf_counter
+import argparse, json
+
+def asset_paths():
+    paths = []
+    for folder_path, sub_folders, image_names in os.walk('Assets'):
+        sub_folders[:] = sorted(sub_folder for sub_folder in sub_folders if sub_folder != 'cache')
+        paths += [os.path.join(folder_path, name) for name in sorted(image_names) if name.endswith('.png')]
+    return paths
+
+def measure(paths, repeat, cache_folder, workers):
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        [convert_image(surf) for surf in decode_images(paths, cache_folder, workers)]
+        times.append(perf_counter() - start)
+    return {'median_ms': median(times) * 1000, 'min_ms': min(times) * 1000}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Бенчмарк загрузки изображений')
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--json', metavar = 'PATH', help = 'сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+    paths = asset_paths()
+
+    results = {'images': len(paths), 'cpus': os.cpu_count()}
+    results['cold'] = measure(paths, args.repeat, None, 1)
+    results['parallel'] = measure(paths, args.repeat, None, None)
+    with TemporaryDirectory() as cache_folder:
+        decode_images(paths, cache_folder) # заполнение кеша
+        results['warm'] = measure(paths, args.repeat, cache_folder, 1)
+        results['warm parallel'] = measure(paths, args.repeat, cache_folder, None)
+
+    print(f"{results['images']} images, {results['cpus']} CPUs")
+    for name in ('cold', 'parallel', 'warm', 'warm parallel'):
+        print(f"{name:>14}: {results[name]['median_ms']:8.2f} ms (min {results[name]['min_ms']:.2f} ms)")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent = 2)
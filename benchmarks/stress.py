@@ -0,0 +1,272 @@
+'''
+Бенчмарк уровней на синтетических картах.
+
+Встроенные уровни слишком малы (50x20 и 100x30 тайлов), чтобы на них была видна зависимость от размера уровня,
+поэтому карты генерируются в памяти: CompiledLevel с теми же слоями, что и в TMX, и тайлами из тайлсета игры.
+Размер, плотность земли и количество слаймов, летающих платформ и предметов задаются сценарием.
+
+Замеряются:
+- import: загрузка изображений игры (load_assets);
+- switch: переключение на встроенный уровень - создание сразу и выдача уровня, подготовленного в фоне;
+- для каждого сценария: создание Level (разбор карты и setup), шаг симуляции Level.update и отрисовка Level.draw.
+
+Запуск из корня репозитория:
+    python benchmarks/stress.py [--scenario large] [--steps 600] [--json results.json] [--baseline baseline.json]
+
+С --baseline результаты сравниваются с сохраненными ранее; при замедлении больше --tolerance скрипт завершается с кодом 1.
+'''
+import os, sys
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(sys.path[0])
+
+from settings import *
+from main import load_assets, LEVEL_PATHS
+from compiler import load_level, CompiledLevel, TileLayer, LevelObject
+from loader import LevelLoader
+from controls import ActionInput, RIGHT, JUMP
+from level import Level
+from data import Data
+from ui import UI
+from array import array
+from random import Random
+from statistics import median
+from time import perf_counter
+import argparse, json, platform
+
+# размер карты в тайлах, доля тайлов над землей, занятых платформами из земли, и количество объектов
+SCENARIOS = {
+    'small': {'width': 50, 'height': 20, 'terrain_density': 0.05, 'slimes': 3, 'platforms': 2, 'items': 20},
+    'medium': {'width': 200, 'height': 40, 'terrain_density': 0.08, 'slimes': 40, 'platforms': 10, 'items': 100},
+    'large': {'width': 1000, 'height': 60, 'terrain_density': 0.08, 'slimes': 300, 'platforms': 60, 'items': 800},
+}
+
+def tileset(sample):
+    '''
+    Возвращает изображения тайлсета и номера тайлов, которые встречаются в каждом тайловом слое образца.
+    '''
+    images = sample.get_layer_by_name('Terrain').images
+    gids = {name: sorted(set(sample.get_layer_by_name(name).data) - {0}) for name in ('Sky', 'Cloud', 'Lake', 'Terrain', 'Decoration')}
+    return images, gids
+
+def generate_level(width, height, terrain_density, slimes, platforms, items, images, gids, seed = 0):
+    '''
+    Создает синтетический уровень: сплошная земля внизу, отрезки земли над ней, облака, вода,
+    игрок слева, дверь справа, слаймы на земле и платформах, летающие платформы и предметы в воздухе.
+
+    :param width: Ширина в тайлах.
+    :type width: int
+    :param height: Высота в тайлах (не меньше 10).
+    :type height: int
+    :param terrain_density: Доля тайлов над землей, занятых отрезками земли.
+    :type terrain_density: float
+    :param images: Изображения тайлсета по номерам тайлов.
+    :type images: list
+    :param gids: Имя тайлового слоя -> номера тайлов, из которых он составляется.
+    :type gids: dict
+    :param seed: Seed генератора, одинаковый seed дает одинаковую карту.
+    :type seed: int
+    :rtype: compiler.CompiledLevel
+    '''
+    random = Random(seed)
+    layers = {name: array('H', bytes(width * height * 2)) for name in gids}
+    ground = height - 2 # первая строка сплошной земли
+
+    def put(name, x, y):
+        layers[name][y * width + x] = random.choice(gids[name])
+
+    for y in range(height):
+        for x in range(width):
+            put('Sky', x, y)
+            if y < height // 3 and random.random() < 0.05:
+                put('Cloud', x, y)
+            if y >= ground:
+                put('Terrain', x, y)
+                put('Lake', x, y)
+
+    # отрезки земли над полом, длиной 3-8 тайлов
+    runs = []
+    for _ in range(int(width * (ground - 4) * terrain_density / 5.5)):
+        length = random.randint(3, 8)
+        x, y = random.randrange(0, width - length), random.randrange(3, ground - 3)
+        for column in range(x, x + length):
+            put('Terrain', column, y)
+        runs.append((x, y, length))
+    # декорации стоят на полу
+    for x in range(width):
+        if random.random() < 0.03:
+            put('Decoration', x, ground - 1)
+
+    floor_y = ground * TILE_SIZE
+    objects = [LevelObject('player', 2 * TILE_SIZE, floor_y - 64, 58, 57, 0, {}),
+               LevelObject('doors', (width - 3) * TILE_SIZE, floor_y - 32, 64, 32, 0, {})]
+
+    enemies = []
+    for _ in range(slimes):
+        # слайм ставится на пол или на случайный отрезок земли
+        if runs and random.random() < 0.5:
+            x, y, length = random.choice(runs)
+            position = ((x + random.randrange(length)) * TILE_SIZE, y * TILE_SIZE - 16)
+        else:
+            position = (random.randrange(8, width - 4) * TILE_SIZE, floor_y - 16)
+        enemies.append(LevelObject('slime', *position, 32, 16, 0, {}))
+
+    moving = []
+    for number in range(platforms):
+        x, y = random.randrange(0, width - 8) * TILE_SIZE, random.randrange(2, ground - 8) * TILE_SIZE
+        size = (192, 32) if number % 2 == 0 else (32, 192)
+        moving.append(LevelObject('flying platform', x, y, *size, 0, {'platform': True, 'speed': 60, 'flip': False}))
+
+    pickups = [LevelObject(random.choice(('coin', 'potion')), random.randrange(0, width) * TILE_SIZE,
+                           random.randrange(2, ground - 1) * TILE_SIZE, 32, 32, 0, {}) for _ in range(items)]
+
+    level_layers = {name: TileLayer(name, width, height, data, images) for name, data in layers.items()}
+    level_layers.update({'Object': objects, 'Enemies': enemies, 'Moving Objects': moving, 'Items': pickups})
+    return CompiledLevel(width, height, level_layers)
+
+def summary(times):
+    '''
+    Сводка замеров в миллисекундах.
+    '''
+    times = sorted(times)
+    return {'mean_ms': sum(times) / len(times) * 1000, 'median_ms': median(times) * 1000,
+            'p95_ms': times[round((len(times) - 1) * 0.95)] * 1000, 'max_ms': times[-1] * 1000}
+
+def measure_import(repeat):
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        load_assets()
+        times.append(perf_counter() - start)
+    return summary(times)
+
+def measure_switch(level_frames, ui, repeat):
+    '''
+    Переключение на второй встроенный уровень: создание уровня в момент перехода
+    и получение уровня, заранее подготовленного LevelLoader в фоновом потоке.
+    '''
+    data = Data(ui)
+    build = lambda index, level_map: Level(level_map, level_frames, data, lambda level: None, ActionInput(), index)
+    cold, prepared = [], []
+    for _ in range(repeat):
+        loader = LevelLoader(LEVEL_PATHS, build)
+        start = perf_counter()
+        loader.take(1)
+        cold.append(perf_counter() - start)
+
+        loader.prepare(1)
+        loader.prepared[1].result() # ждем фоновый поток, замеряется только сам переход
+        start = perf_counter()
+        loader.take(1)
+        prepared.append(perf_counter() - start)
+        loader.executor.shutdown()
+    return {'cold': summary(cold), 'prepared': summary(prepared)}
+
+def measure_scenario(config, level_frames, ui, images, gids, steps, repeat, seed):
+    level_map = generate_level(**config, images = images, gids = gids, seed = seed)
+    data = Data(ui)
+
+    setup = []
+    for _ in range(repeat):
+        start = perf_counter()
+        level = Level(level_map, level_frames, data, lambda level: None, ActionInput(RIGHT), seed)
+        setup.append(perf_counter() - start)
+
+    # игрок бежит вправо и периодически прыгает, чтобы камера двигалась по уровню
+    update, draw = [], []
+    for step in range(steps):
+        level.input_source.actions = RIGHT | JUMP if step % 90 < 10 else RIGHT
+        start = perf_counter()
+        level.update(FIXED_DT)
+        middle = perf_counter()
+        level.draw(0.5)
+        update.append(middle - start)
+        draw.append(perf_counter() - middle)
+        if level.dead:
+            break
+
+    return {'config': config, 'tiles': config['width'] * config['height'], 'sprites': len(level.all_sprites), 'steps': len(update),
+            'setup': summary(setup), 'update': summary(update), 'draw': summary(draw)}
+
+def flatten(results, prefix = ''):
+    '''
+    Раскладывает вложенные результаты в пары путь -> время, например 'scenarios.large.update.p95_ms'.
+    '''
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f'{prefix}{key}.'))
+        elif key.endswith('_ms'):
+            values[prefix + key] = value
+    return values
+
+def compare(results, baseline, tolerance):
+    '''
+    Печатает отношение текущих времен к базовым и возвращает список замедлившихся метрик.
+    Сравниваются медианы и p95: средние и максимумы слишком шумят.
+    '''
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    print(f"\n{'metric':<40}{'baseline':>10}{'current':>10}{'ratio':>8}")
+    for key, value in current.items():
+        if key not in previous or not key.endswith(('median_ms', 'p95_ms')):
+            continue
+        ratio = value / previous[key] if previous[key] else 1
+        marker = ''
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            marker = ' !'
+        print(f"{key:<40}{previous[key]:>10.3f}{value:>10.3f}{ratio:>8.2f}{marker}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Бенчмарк уровней на синтетических картах')
+    parser.add_argument('--scenario', action = 'append', choices = list(SCENARIOS), help = 'сценарий (можно несколько), по умолчанию все')
+    parser.add_argument('--size', metavar = 'WxH', help = 'свой сценарий: размер карты в тайлах')
+    parser.add_argument('--terrain-density', type = float, default = 0.08)
+    parser.add_argument('--slimes', type = int, default = 50)
+    parser.add_argument('--platforms', type = int, default = 10)
+    parser.add_argument('--items', type = int, default = 100)
+    parser.add_argument('--steps', type = int, default = 600, help = 'шагов симуляции на сценарий')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'повторов для загрузки, переключения и создания уровня')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--json', metavar = 'PATH', help = 'сохранить результаты в JSON')
+    parser.add_argument('--baseline', metavar = 'PATH', help = 'сравнить с сохраненными результатами')
+    parser.add_argument('--tolerance', type = float, default = 0.2, help = 'допустимое замедление относительно базовых результатов')
+    args = parser.parse_args()
+
+    scenarios = {name: SCENARIOS[name] for name in args.scenario or []}
+    if args.size:
+        width, height = map(int, args.size.lower().split('x'))
+        scenarios['custom'] = {'width': width, 'height': height, 'terrain_density': args.terrain_density,
+                               'slimes': args.slimes, 'platforms': args.platforms, 'items': args.items}
+    if not scenarios:
+        scenarios = dict(SCENARIOS)
+
+    pygame.init()
+    pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+    results = {'python': platform.python_version(), 'pygame': pygame.version.ver, 'cpus': os.cpu_count(), 'steps': args.steps}
+    results['import'] = measure_import(args.repeat)
+    atlas, level_frames, ui_frames = load_assets()
+    ui = UI(pygame.font.Font('Assets/Font/1.ttf', 30), ui_frames)
+    images, gids = tileset(load_level(LEVEL_PATHS[0]))
+    results['switch'] = measure_switch(level_frames, ui, args.repeat)
+    results['scenarios'] = {name: measure_scenario(config, level_frames, ui, images, gids, args.steps, args.repeat, args.seed)
+                            for name, config in scenarios.items()}
+
+    print(f"import: {results['import']['median_ms']:.2f} ms")
+    print(f"switch: cold {results['switch']['cold']['median_ms']:.2f} ms, prepared {results['switch']['prepared']['median_ms']:.2f} ms")
+    for name, result in results['scenarios'].items():
+        print(f"{name:>8} {result['config']['width']}x{result['config']['height']}, {result['sprites']} sprites: "
+              f"setup {result['setup']['median_ms']:.1f} ms, "
+              f"update {result['update']['median_ms']:.3f} ms (p95 {result['update']['p95_ms']:.3f}), "
+              f"draw {result['draw']['median_ms']:.3f} ms (p95 {result['draw']['p95_ms']:.3f})")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent = 2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"\nзамедлились: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,246 @@
+from settings import *
+from support import decode_images
+from pytmx import TiledMap, TiledTileLayer, TileFlags
+from pytmx.util_pygame import handle_transformation
+from array import array
+from hashlib import sha1
+from struct import Struct
+from os import makedirs, stat
+from os.path import join, dirname, basename, splitext, relpath, normpath
+from glob import glob
+import json, zlib
+import xml.etree.ElementTree as ElementTree
+
+# формат скомпилированного уровня:
+# заголовок, JSON со списком исходных файлов (для проверки актуальности), затем сжатые zlib
+# длина JSON с описанием уровня, сам JSON и массивы номеров тайлов всех тайловых слоев (uint16)
+LEVEL_MAGIC = b'PBLV'
+LEVEL_VERSION = 1
+LEVEL_HEADER = Struct('<4sBI') # magic, версия, длина JSON с исходниками
+META_LENGTH = Struct('<I')
+LEVEL_CACHE_FOLDER = 'cache'
+
+class TileLayer:
+    '''
+    Тайловый слой скомпилированного уровня. Повторяет интерфейс pytmx.TiledTileLayer, которым пользуется Level.
+    '''
+    def __init__(self, name, width, height, data, images):
+        self.name = name
+        self.width, self.height = width, height
+        self.data = data # номера тайлов построчно
+        self.images = images
+
+    def tiles(self):
+        '''
+        Перебирает непустые тайлы слоя построчно.
+
+        :return: Кортежи (x, y, изображение тайла).
+        '''
+        width, images = self.width, self.images
+        for index, gid in enumerate(self.data):
+            if gid and images[gid]:
+                yield index % width, index // width, images[gid]
+
+class LevelObject:
+    '''
+    Объект из объектного слоя скомпилированного уровня.
+    '''
+    __slots__ = ('name', 'x', 'y', 'width', 'height', 'gid', 'properties')
+
+    def __init__(self, name, x, y, width, height, gid, properties):
+        self.name = name
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.gid = gid
+        self.properties = properties
+
+class CompiledLevel:
+    '''
+    Класс CompiledLevel - уровень, загруженный из скомпилированного файла.
+    Предоставляет ту же часть интерфейса pytmx.TiledMap, что использует Level: width, height и get_layer_by_name.
+    '''
+    def __init__(self, width, height, layers):
+        self.width, self.height = width, height
+        self.layers = layers # имя слоя -> TileLayer или список LevelObject
+
+    def get_layer_by_name(self, name):
+        try:
+            return self.layers[name]
+        except KeyError:
+            raise ValueError(f'слой "{name}" не найден')
+
+def cache_path(tmx_path):
+    '''
+    Возвращает путь к скомпилированному файлу уровня: Levels/cache/<имя карты>.lvl.
+    '''
+    return join(dirname(tmx_path), LEVEL_CACHE_FOLDER, splitext(basename(tmx_path))[0] + '.lvl')
+
+def file_hash(path):
+    with open(path, 'rb') as file:
+        return sha1(file.read()).hexdigest()
+
+def compile_level(tmx_path):
+    '''
+    Компилирует TMX-карту вместе с ее тайлсетами в двоичный формат.
+    Изображения тайлов не загружаются: для каждого тайла сохраняется ссылка на изображение тайлсета,
+    прямоугольник внутри него и флаги отражения.
+
+    :param tmx_path: Путь к TMX-файлу.
+    :type tmx_path: str
+    :return: Содержимое скомпилированного файла.
+    :rtype: bytes
+    '''
+    folder = dirname(tmx_path)
+    sources = [tmx_path] + [normpath(join(folder, tileset.get('source')))
+                            for tileset in ElementTree.parse(tmx_path).getroot().iter('tileset') if tileset.get('source')]
+
+    def image_loader(filename, colorkey, **kwargs):
+        sources.append(normpath(filename))
+        source = relpath(filename, folder).replace('\\', '/')
+
+        def load_image(rect = None, flags = None):
+            flag_bits = (flags.flipped_horizontally | flags.flipped_vertically << 1 | flags.flipped_diagonally << 2) if flags else 0
+            return [source, list(rect) if rect else None, colorkey, flag_bits]
+
+        return load_image
+
+    tmx_map = TiledMap(tmx_path, image_loader = image_loader)
+    meta = {'width': tmx_map.width, 'height': tmx_map.height, 'images': tmx_map.images, 'layers': []}
+    arrays = []
+    for layer in tmx_map.layers:
+        if isinstance(layer, TiledTileLayer):
+            data = array('H', (gid for row in layer.data for gid in row))
+            arrays.append(data.tobytes())
+            meta['layers'].append({'name': layer.name, 'tiles': len(data)})
+        else:
+            objects = [[obj.name, obj.x, obj.y, obj.width, obj.height, obj.gid, obj.properties] for obj in layer]
+            meta['layers'].append({'name': layer.name, 'objects': objects})
+
+    sources = {relpath(path, folder).replace('\\', '/'): [stat(path).st_mtime, file_hash(path)] for path in dict.fromkeys(sources)}
+    sources = json.dumps(sources).encode()
+    meta = json.dumps(meta).encode()
+    body = zlib.compress(META_LENGTH.pack(len(meta)) + meta + b''.join(arrays))
+    return LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, len(sources)) + sources + body
+
+def revalidate(data, folder):
+    '''
+    Проверяет, что скомпилированный файл соответствует исходникам.
+    Сначала сравнивается время изменения, и только если оно отличается - хеш содержимого.
+    Если содержимое совпало, а время изменения нет (после git checkout или touch), в заголовок записывается
+    новое время, чтобы следующие загрузки снова обходились без хеширования.
+
+    :param data: Содержимое скомпилированного файла.
+    :type data: bytes
+    :param folder: Папка TMX-файла, относительно которой записаны пути исходников.
+    :type folder: str
+    :return: None, если файл устарел; сам data, если он актуален; новое содержимое с обновленным заголовком,
+        если актуален, но время изменения исходников поменялось.
+    :rtype: bytes
+    '''
+    magic, version, length = LEVEL_HEADER.unpack_from(data)
+    if magic != LEVEL_MAGIC or version != LEVEL_VERSION:
+        return None
+    sources = json.loads(data[LEVEL_HEADER.size:LEVEL_HEADER.size + length])
+    touched = False
+    try:
+        for source, entry in sources.items():
+            path = join(folder, source)
+            mtime = stat(path).st_mtime
+            if mtime != entry[0]:
+                if file_hash(path) != entry[1]:
+                    return None
+                entry[0] = mtime
+                touched = True
+    except OSError:
+        return None
+    if not touched:
+        return data
+    header = json.dumps(sources).encode()
+    return LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, len(header)) + header + data[LEVEL_HEADER.size + length:]
+
+def read_level(data, folder):
+    '''
+    Создает CompiledLevel из скомпилированного файла. Изображение каждого тайлсета загружается один раз,
+    а тайлы вырезаются из него как подповерхности.
+    Изображения переводятся не в формат экрана, а в формат поверхностей с SRCALPHA: тайлы только впечатываются
+    в чанки StaticLayer, а такое преобразование не обращается к окну и может выполняться в фоновом потоке LevelLoader.
+
+    :param data: Содержимое скомпилированного файла.
+    :type data: bytes
+    :param folder: Папка TMX-файла, относительно которой записаны пути изображений.
+    :type folder: str
+    :rtype: CompiledLevel
+    '''
+    length = LEVEL_HEADER.unpack_from(data)[2]
+    body = zlib.decompress(data[LEVEL_HEADER.size + length:])
+    meta_length = META_LENGTH.unpack_from(body)[0]
+    meta = json.loads(body[META_LENGTH.size:META_LENGTH.size + meta_length])
+
+    # изображения тайлсетов декодируются параллельно и переводятся в формат чанков,
+    # иначе каждый тайл впечатывался бы с перестановкой каналов
+    colorkeys = {descriptor[0]: descriptor[2] for descriptor in meta['images'] if descriptor}
+    sheets = dict(zip(colorkeys, decode_images([join(folder, source) for source in colorkeys])))
+    chunk_format = pygame.Surface((1, 1), pygame.SRCALPHA)
+    for source, colorkey in colorkeys.items():
+        if colorkey:
+            sheets[source].set_colorkey(pygame.Color(f'#{colorkey}'))
+        sheets[source] = sheets[source].convert(chunk_format)
+
+    images = []
+    for descriptor in meta['images']:
+        if not descriptor:
+            images.append(None)
+            continue
+        source, rect, colorkey, flag_bits = descriptor
+        image = sheets[source].subsurface(rect) if rect else sheets[source]
+        if flag_bits:
+            image = handle_transformation(image, TileFlags(bool(flag_bits & 1), bool(flag_bits & 2), bool(flag_bits & 4)))
+        images.append(image)
+
+    layers = {}
+    offset = META_LENGTH.size + meta_length
+    for layer in meta['layers']:
+        if 'tiles' in layer:
+            data = array('H')
+            data.frombytes(body[offset:offset + layer['tiles'] * data.itemsize])
+            offset += layer['tiles'] * data.itemsize
+            layers[layer['name']] = TileLayer(layer['name'], meta['width'], meta['height'], data, images)
+        else:
+            layers[layer['name']] = [LevelObject(*obj) for obj in layer['objects']]
+    return CompiledLevel(meta['width'], meta['height'], layers)
+
+def load_level(tmx_path):
+    '''
+    Загружает уровень из скомпилированного файла в папке cache рядом с картой.
+    Если файла нет или исходники изменились, карта компилируется заново и файл перезаписывается,
+    а если у исходников изменилось только время изменения - в файле обновляется заголовок.
+
+    :param tmx_path: Путь к TMX-файлу.
+    :type tmx_path: str
+    :rtype: CompiledLevel
+    '''
+    path = cache_path(tmx_path)
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        data = b''
+    fresh = revalidate(data, dirname(tmx_path)) if len(data) >= LEVEL_HEADER.size else None
+    if fresh is not data:
+        data = fresh if fresh is not None else compile_level(tmx_path)
+        try:
+            makedirs(dirname(path), exist_ok = True)
+            with open(path, 'wb') as file:
+                file.write(data)
+        except OSError:
+            pass # без записи кеша уровень все равно загрузится из памяти
+    return read_level(data, dirname(tmx_path))
+
+if __name__ == '__main__':
+    # шаг сборки: python compiler.py компилирует все карты из папки Levels
+    for tmx_path in sorted(glob(join('Levels', '*.tmx'))):
+        data = compile_level(tmx_path)
+        makedirs(dirname(cache_path(tmx_path)), exist_ok = True)
+        with open(cache_path(tmx_path), 'wb') as file:
+            file.write(data)
+        print(f'{tmx_path} -> {cache_path(tmx_path)} ({len(data)} bytes)')
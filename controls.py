@@ -0,0 +1,122 @@
+from settings import *
+from struct import Struct
+
+# действия игрока - биты маски ввода
+RIGHT, LEFT, DOWN, ATTACK, JUMP = 1, 2, 4, 8, 16
+
+KEY_BINDINGS = {
+    RIGHT: pygame.K_RIGHT,
+    LEFT: pygame.K_LEFT,
+    DOWN: pygame.K_DOWN,
+    ATTACK: pygame.K_SPACE,
+    JUMP: pygame.K_UP
+}
+REWIND_KEY = pygame.K_r # перемотка уровня на предыдущую контрольную точку
+
+# формат файла реплея: заголовок, затем пары (длина серии шагов, маска ввода)
+REPLAY_MAGIC = b'PBRP'
+REPLAY_VERSION = 1
+REPLAY_HEADER = Struct('<4sBIBHI') # magic, версия, seed, стартовый уровень, шагов в секунду, число серий
+REPLAY_RUN = Struct('<HB') # длина серии, маска
+MAX_RUN = 0xFFFF
+
+class KeyboardInput:
+    '''
+    Источник ввода с клавиатуры. Возвращает маску нажатых действий.
+    '''
+    def read(self):
+        '''
+        :return: Битовая маска действий, нажатых на текущем шаге.
+        :rtype: int
+        '''
+        keys = pygame.key.get_pressed()
+        actions = 0
+        for action, key in KEY_BINDINGS.items():
+            if keys[key]:
+                actions |= action
+        return actions
+
+class ActionInput:
+    '''
+    Источник ввода, которым управляет программа (например, агент в среде env.Env): возвращает последнюю заданную маску.
+    '''
+    def __init__(self, actions = 0):
+        self.actions = actions
+
+    def read(self):
+        return self.actions
+
+class ReplayRecorder:
+    '''
+    Класс ReplayRecorder оборачивает другой источник ввода и записывает маску каждого шага.
+    Одинаковые подряд идущие маски хранятся одной серией, поэтому файл получается компактным.
+    '''
+    def __init__(self, source, seed, level = 0):
+        '''
+        :param source: Источник ввода, который записывается (например, KeyboardInput).
+        :param seed: Seed генератора случайных чисел игры.
+        :type seed: int
+        :param level: Номер уровня, с которого началась запись.
+        :type level: int
+        '''
+        self.source = source
+        self.seed = seed
+        self.level = level
+        self.runs = [] # [длина серии, маска]
+
+    def read(self):
+        actions = self.source.read()
+        if self.runs and self.runs[-1][1] == actions and self.runs[-1][0] < MAX_RUN:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1, actions])
+        return actions
+
+    def save(self, path):
+        '''
+        Сохраняет записанный ввод в двоичный файл реплея.
+
+        :param path: Путь к файлу.
+        :type path: str
+        '''
+        with open(path, 'wb') as file:
+            file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.level, round(1 / FIXED_DT), len(self.runs)))
+            for length, actions in self.runs:
+                file.write(REPLAY_RUN.pack(length, actions))
+
+class ReplayInput:
+    '''
+    Класс ReplayInput воспроизводит ввод из файла реплея шаг за шагом.
+    После конца записи возвращает пустую маску, а флаг finished становится True.
+    Атрибуты seed и level - seed игры и уровень, с которых началась запись: игра для воспроизведения создается с ними же.
+    '''
+    def __init__(self, path):
+        '''
+        :param path: Путь к файлу реплея.
+        :type path: str
+        :raises ValueError: Если файл не является реплеем или записан с другим шагом симуляции.
+        '''
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version, self.seed, self.level, rate, count = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f'{path} не является реплеем версии {REPLAY_VERSION}')
+        if rate != round(1 / FIXED_DT):
+            raise ValueError(f'реплей записан с частотой {rate} шагов в секунду, а игра работает с {round(1 / FIXED_DT)}')
+        self.runs = [REPLAY_RUN.unpack_from(data, REPLAY_HEADER.size + index * REPLAY_RUN.size) for index in range(count)]
+        self.steps = sum(length for length, actions in self.runs)
+
+        self.run_index = 0
+        self.run_step = 0
+        self.finished = not self.runs
+
+    def read(self):
+        if self.finished:
+            return 0
+        length, actions = self.runs[self.run_index]
+        self.run_step += 1
+        if self.run_step == length:
+            self.run_index += 1
+            self.run_step = 0
+            self.finished = self.run_index == len(self.runs)
+        return actions
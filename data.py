@@ -13,7 +13,7 @@ class Data:
         self.ui = ui
         self._coins = 0
         self._health = 3
-        self.ui.create_hearts(self._health)
+        self.ui.show_health(self._health)
     
         self.current_level = 0
 
@@ -61,4 +61,20 @@ class Data:
         - value (int): Новое количество хп.
         '''
         self._health = value
-        self.ui.create_hearts(value)
\ No newline at end of file
+        self.ui.show_health(value)
+
+    def snapshot(self):
+        '''
+        Возвращает количество монет и хп для снимка уровня.
+        '''
+        return self._coins, self._health
+
+    def restore(self, state):
+        '''
+        Восстанавливает монеты и хп из snapshot без бонусов за монеты.
+
+        Аргументы:
+        - state (tuple): Результат snapshot.
+        '''
+        self._coins, self._health = state
+        self.ui.show_health(self._health)
@@ -1,11 +1,157 @@
 from settings import *
-from random import choice
+import numpy as np
+
+class SlimeManager:
+    '''
+    Класс SlimeManager хранит состояние всех слаймов уровня в массивах NumPy и обновляет их одним векторным шагом:
+    движение, анимацию и разворот у края платформы или у стены.
+    Вместо проверки прямоугольников столкновений каждый слайм смотрит в карту занятости тайлов (TerrainGrid).
+
+    Координаты хранятся в float32, как и в pygame.FRect, поэтому результат совпадает с поспрайтовой проверкой.
+    '''
+    def __init__(self, frames, flipped_frames, terrain, random):
+        '''
+        Аргументы:
+        - frames (list): Список кадров анимации.
+        - flipped_frames (list): Те же кадры, отраженные по горизонтали (движение влево).
+        - terrain (TerrainGrid): Карта занятых тайлов уровня.
+        - random (random.Random): Генератор случайных чисел уровня, чтобы поведение воспроизводилось по seed.
+        '''
+        self.frames, self.flipped_frames = frames, flipped_frames
+        self.random = random
+        self.terrain = terrain
+
+        self.sprites = []
+        self.x = np.zeros(0, np.float32)
+        self.y = np.zeros(0, np.float32)
+        self.width = np.zeros(0, np.float32)
+        self.height = np.zeros(0, np.float32)
+        self.direction = np.zeros(0, np.int8)
+        self.facing = np.zeros(0, np.int8) # направление, по которому выбран текущий кадр
+        self.speed = np.zeros(0, np.float64)
+        self.frame_index = np.zeros(0, np.float64)
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def add(self, sprite, speed = 20):
+        '''
+        Регистрирует слайм и выбирает ему случайное начальное направление.
+
+        :param sprite: Спрайт слайма.
+        :type sprite: Slime
+        :param speed: Скорость движения в пикселях в секунду.
+        :type speed: float
+        '''
+        sprite.index = len(self.sprites)
+        self.sprites.append(sprite)
+        self.x = np.append(self.x, np.float32(sprite.rect.x))
+        self.y = np.append(self.y, np.float32(sprite.rect.y))
+        self.width = np.append(self.width, np.float32(sprite.rect.width))
+        self.height = np.append(self.height, np.float32(sprite.rect.height))
+        self.direction = np.append(self.direction, np.int8(self.random.choice((-1,1))))
+        self.facing = np.append(self.facing, np.int8(1)) # до первого шага кадр не отражен
+        self.speed = np.append(self.speed, speed)
+        self.frame_index = np.append(self.frame_index, 0.0)
+
+    def remove(self, sprite):
+        '''
+        Удаляет слайм: на его место в массивах переносится последний слайм.
+        '''
+        index, last = sprite.index, len(self.sprites) - 1
+        moved = self.sprites[last]
+        self.sprites[index] = moved
+        moved.index = index
+        for array in (self.x, self.y, self.width, self.height, self.direction, self.facing, self.speed, self.frame_index):
+            array[index] = array[last]
+        self.sprites.pop()
+        self.x, self.y = self.x[:last], self.y[:last]
+        self.width, self.height = self.width[:last], self.height[:last]
+        self.direction, self.facing = self.direction[:last], self.facing[:last]
+        self.speed, self.frame_index = self.speed[:last], self.frame_index[:last]
+
+    def snapshot(self):
+        '''
+        Возвращает копию состояния всех слаймов для снимка уровня. Спрайты сохраняются ссылками,
+        поэтому при восстановлении уничтоженные после снимка слаймы не создаются заново.
+        '''
+        return (list(self.sprites), self.x.copy(), self.y.copy(), self.width.copy(), self.height.copy(),
+                self.direction.copy(), self.facing.copy(), self.speed.copy(), self.frame_index.copy())
+
+    def restore(self, state):
+        '''
+        Восстанавливает состояние из snapshot. Возвращать слаймов в группы спрайтов должен уровень.
+        '''
+        sprites, x, y, width, height, direction, facing, speed, frame_index = state
+        self.sprites = list(sprites)
+        self.x, self.y, self.width, self.height = x.copy(), y.copy(), width.copy(), height.copy()
+        self.direction, self.facing = direction.copy(), facing.copy()
+        self.speed, self.frame_index = speed.copy(), frame_index.copy()
+        for index, (sprite, x) in enumerate(zip(self.sprites, self.x.tolist())):
+            sprite.index = index
+            sprite.rect.x = x
+
+    def image(self, index):
+        '''
+        Возвращает текущий кадр слайма с учетом направления.
+        '''
+        frames = self.flipped_frames if self.facing[index] < 0 else self.frames
+        return frames[int(self.frame_index[index] % len(frames))]
+
+    def update(self, dt, area = None):
+        '''
+        Двигает и анимирует всех слаймов, разворачивает тех, кто дошел до края или уперся в стену,
+        и переносит новые позиции в rect спрайтов.
+
+        :param dt: Длительность шага в секундах.
+        :type dt: float
+        :param area: Активная область уровня. Слаймы за ее пределами спят: не двигаются и не анимируются.
+        :type area: pygame.FRect
+        :return: Спрайты, которые сдвинулись на этом шаге.
+        :rtype: list
+        '''
+        if not self.sprites:
+            return []
+        if area is None:
+            awake = np.ones(len(self.sprites), bool)
+        else:
+            awake = (self.x + self.width > area.left) & (self.x < area.right) & \
+                    (self.y + self.height > area.top) & (self.y < area.bottom)
+            if not awake.any():
+                return []
+
+        # анимация: кадр выбирается по направлению до разворота на этом шаге
+        self.frame_index[awake] += ANIMATION_SPEED * dt
+        self.facing[awake] = self.direction[awake]
+
+        # движение: сложение в double и округление до float32, как при присваивании FRect.x
+        moved = (self.x.astype(np.float64) + self.direction * self.speed * dt).astype(np.float32)
+        self.x = np.where(awake, moved, self.x)
+
+        # изменение направления
+        right = self.x + self.width
+        left = self.x - np.float32(1) # щупы шириной -1 pygame нормализует в [left - 1, left)
+        bottom = self.y + self.height
+        center = self.y + self.height / np.float32(2)
+        moving_right, moving_left = self.direction > 0, self.direction < 0
+        probe = self.terrain.probe
+        turn = moving_right & (~probe(right, bottom) | probe(right, center)) | \
+               moving_left & (~probe(left, bottom) | probe(left, center))
+        self.direction[turn & awake] *= -1
+
+        x, moved = self.x.tolist(), []
+        for index in np.flatnonzero(awake).tolist():
+            sprite = self.sprites[index]
+            sprite.rect.x = x[index]
+            moved.append(sprite)
+        return moved
 
 class Slime(pygame.sprite.Sprite):
     '''
     Класс Slime представляет собой врага в игре. Он перемещается по горизонтали и меняет направление при столкновении с препятствиями.
+    Сам спрайт хранит только rect для отрисовки и столкновений, а движением и анимацией управляет SlimeManager.
     '''
-    def __init__(self, pos, frames, groups, collision_sprites):
+    def __init__(self, pos, frames, groups, manager):
         '''
         Инициализирует объект Slime.
 
@@ -13,37 +159,23 @@ class Slime(pygame.sprite.Sprite):
         - pos (tuple): Начальная позиция спрайта (x, y).
         - frames (list): Список кадров анимации.
         - groups (list): Список групп спрайтов, к которым принадлежит этот спрайт.
-        - collision_sprites (list): Список спрайтов, с которыми может столкнуться Slime.
+        - manager (SlimeManager): Менеджер, который обновляет всех слаймов уровня.
         '''
         super().__init__(groups)
-        self.frames, self.frame_index = frames, 0
-        self.image = self.frames[self.frame_index]
-        self.rect = self.image.get_frect(topleft = pos)
+        self.rect = frames[0].get_frect(topleft = pos)
         self.z = Z_LAYERS['main']
-        self.speed = 20
+        self.manager = manager
+        manager.add(self)
 
-        self.direction = choice((-1,1))
-        self.collision_rects = [sprite.rect for sprite in collision_sprites]
+    @property
+    def image(self):
+        return self.manager.image(self.index)
 
-    def update(self, dt):
-        # анимация
-        self.frame_index += ANIMATION_SPEED * dt
-        self.image = self.frames[int(self.frame_index % len(self.frames))]
-        self.image = pygame.transform.flip(self.image, True, False) if self.direction < 0 else self.image    
-        
-        # движение
-        self.rect.x += self.direction * self.speed * dt
+    @property
+    def direction(self):
+        return int(self.manager.direction[self.index])
 
-        # изменение направления
-        floor_rect_right = pygame.FRect(self.rect.bottomright, (1,1))
-        floor_rect_left = pygame.FRect(self.rect.bottomleft, (-1,1))
-        wall_rect_right = pygame.FRect(self.rect.midright, (1, 1))
-        wall_rect_left = pygame.FRect(self.rect.midleft, (-1, 1))
-
-
-        # check 
-        if floor_rect_right.collidelist(self.collision_rects) < 0 and self.direction > 0 or \
-                floor_rect_left.collidelist(self.collision_rects) < 0 and self.direction < 0 or \
-                wall_rect_right.collidelist(self.collision_rects) >= 0 and self.direction > 0 or \
-                wall_rect_left.collidelist(self.collision_rects) >= 0 and self.direction < 0:
-            self.direction *= -1
\ No newline at end of file
+    def kill(self):
+        if self.alive():
+            self.manager.remove(self)
+        super().kill()
@@ -0,0 +1,299 @@
+'''
+Программный интерфейс игры для автоматических агентов: среда с методами reset/step без окна и главного цикла Game.run.
+
+Env - одна среда (один уровень в текущем процессе).
+VectorEnv - N независимых сред в отдельных процессах; наблюдения, награды и флаги завершения
+передаются через общую память, а не сериализуются на каждом шаге.
+
+Пример:
+    with VectorEnv(8, seed = 1) as envs:
+        observations = envs.reset()
+        observations, rewards, dones, infos = envs.step([RIGHT | JUMP] * 8)
+'''
+from settings import *
+from main import load_assets, LEVEL_PATHS
+from level import Level
+from data import Data
+from ui import UI
+from compiler import load_level
+from controls import ActionInput, RIGHT, LEFT, DOWN, ATTACK, JUMP
+from multiprocessing import get_context, shared_memory
+from os import environ
+from random import Random
+from math import hypot
+import numpy as np
+
+# наблюдение - вектор float32:
+# 0-1 позиция игрока в тайлах, 2-3 скорость игрока в тайлах в секунду, 4-6 касание пола, левой и правой стены,
+# 7 атака, 8 здоровье, 9 монеты, 10-11 смещение до двери в тайлах,
+# далее по два числа (смещение в тайлах) для NEAREST_DANGERS ближайших опасных объектов, нули если их меньше
+NEAREST_DANGERS = 4
+OBSERVATION_SIZE = 12 + NEAREST_DANGERS * 2
+ACTION_COUNT = 32 # все маски из RIGHT, LEFT, DOWN, ATTACK, JUMP
+
+# награды
+REWARD_ITEM = 1 # за подобранный предмет
+REWARD_DAMAGE = -1 # за каждое потерянное сердце
+REWARD_PROGRESS = 0.1 # за каждый тайл, на который игрок приблизился к двери
+REWARD_FINISH = 10
+REWARD_DEATH = -10
+
+class Env:
+    '''
+    Класс Env - среда одного уровня. Эпизод заканчивается, когда игрок доходит до двери,
+    падает с уровня, теряет все здоровье или исчерпывает лимит шагов.
+    У каждого уровня свои часы симуляции, поэтому несколько сред могут шагать в одном процессе;
+    VectorEnv нужен, чтобы они шагали параллельно.
+    '''
+    def __init__(self, level = 0, seed = None, frame_skip = 1, max_steps = None):
+        '''
+        :param level: Номер уровня.
+        :type level: int
+        :param seed: Seed, из которого выводятся seed'ы эпизодов.
+        :type seed: int
+        :param frame_skip: Сколько шагов симуляции FIXED_DT выполняется за один step с одним и тем же действием.
+        :type frame_skip: int
+        :param max_steps: Лимит вызовов step в эпизоде, None - без лимита.
+        :type max_steps: int
+        '''
+        environ.setdefault('SDL_VIDEODRIVER', 'dummy') # среде не нужно окно, как и Game(headless = True)
+        pygame.init()
+        self.level_index = level
+        self.frame_skip = frame_skip
+        self.max_steps = max_steps
+        self.random = Random(seed)
+
+        self.atlas, self.level_frames, ui_frames = load_assets()
+        self.ui = UI(pygame.font.Font('Assets/Font/1.ttf', 30), ui_frames)
+        self.level_map = load_level(LEVEL_PATHS[level])
+        self.input_source = ActionInput()
+        self.level = None
+
+    def reset(self, seed = None):
+        '''
+        Начинает новый эпизод: уровень создается заново с новым здоровьем и монетами.
+
+        :param seed: Seed эпизода. По умолчанию берется из генератора среды.
+        :type seed: int
+        :return: Наблюдение.
+        :rtype: numpy.ndarray
+        '''
+        self.seed = seed if seed is not None else self.random.randrange(2 ** 32)
+        self.data = Data(self.ui)
+        self.data.current_level = self.level_index
+        self.finished = False
+        self.steps = 0
+        self.input_source.actions = 0
+        self.level = Level(self.level_map, self.level_frames, self.data, self.finish, self.input_source, self.seed)
+        self.level.start()
+        self.items = len(self.level.item_sprites)
+        self.health = self.data.health
+        self.distance = self.door_distance()
+        return self.observation()
+
+    def finish(self, current_level):
+        # вызывается уровнем вместо переключения на следующий
+        self.finished = True
+
+    def door_distance(self):
+        '''
+        Возвращает расстояние от игрока до двери в тайлах.
+        '''
+        x, y = self.level.player.hitbox_rect.center
+        door_x, door_y = self.level.level_finish_rect.center
+        return hypot(door_x - x, door_y - y) / TILE_SIZE
+
+    @property
+    def done(self):
+        return self.finished or self.level.dead or self.data.health <= 0
+
+    def step(self, action):
+        '''
+        Выполняет действие.
+
+        :param action: Маска действий (RIGHT, LEFT, DOWN, ATTACK, JUMP из controls).
+        :type action: int
+        :return: Наблюдение, награда, флаг завершения эпизода и словарь с подробностями.
+        :rtype: tuple
+        '''
+        self.input_source.actions = int(action)
+        for _ in range(self.frame_skip):
+            self.level.update(FIXED_DT)
+            if self.done:
+                break
+        self.steps += 1
+
+        items, health, distance = len(self.level.item_sprites), self.data.health, self.door_distance()
+        reward = (self.items - items) * REWARD_ITEM + max(self.health - health, 0) * REWARD_DAMAGE
+        reward += (self.distance - distance) * REWARD_PROGRESS
+        self.items, self.health, self.distance = items, health, distance
+
+        dead = self.level.dead or self.data.health <= 0
+        reward += REWARD_FINISH if self.finished else REWARD_DEATH if dead else 0
+        truncated = not self.done and self.max_steps is not None and self.steps >= self.max_steps
+        info = {'finished': self.finished, 'dead': dead, 'truncated': truncated,
+                'coins': self.data.coins, 'health': self.data.health, 'steps': self.steps}
+        return self.observation(), reward, self.done or truncated, info
+
+    def observation(self, out = None):
+        '''
+        Заполняет вектор наблюдения (формат описан в OBSERVATION_SIZE).
+
+        :param out: Массив float32 длины OBSERVATION_SIZE, в который записывается наблюдение (например, в общей памяти).
+        :type out: numpy.ndarray
+        :rtype: numpy.ndarray
+        '''
+        if out is None:
+            out = np.zeros(OBSERVATION_SIZE, np.float32)
+        player = self.level.player
+        x, y = player.hitbox_rect.center
+        door_x, door_y = self.level.level_finish_rect.center
+        out[:12] = (x / TILE_SIZE, y / TILE_SIZE,
+                    player.direction.x * player.speed / TILE_SIZE, player.direction.y / TILE_SIZE,
+                    player.on_surface['floor'], player.on_surface['left'], player.on_surface['right'],
+                    player.attacking, self.data.health, self.data.coins,
+                    (door_x - x) / TILE_SIZE, (door_y - y) / TILE_SIZE)
+
+        dangers = [((sprite.rect.centerx - x) / TILE_SIZE, (sprite.rect.centery - y) / TILE_SIZE) for sprite in self.level.damage_sprites]
+        dangers.sort(key = lambda offset: offset[0] ** 2 + offset[1] ** 2)
+        out[12:] = 0
+        for number, offset in enumerate(dangers[:NEAREST_DANGERS]):
+            out[12 + number * 2:14 + number * 2] = offset
+        return out
+
+def shared_views(buffer, num_envs):
+    '''
+    Раскладывает общую память на массивы наблюдений, наград и флагов завершения.
+    '''
+    observations = np.ndarray((num_envs, OBSERVATION_SIZE), np.float32, buffer)
+    rewards = np.ndarray(num_envs, np.float32, buffer, observations.nbytes)
+    dones = np.ndarray(num_envs, np.bool_, buffer, observations.nbytes + rewards.nbytes)
+    return observations, rewards, dones
+
+def shared_size(num_envs):
+    return num_envs * (OBSERVATION_SIZE * 4 + 4 + 1)
+
+def worker(index, memory_name, num_envs, connection, env_kwargs):
+    '''
+    Процесс одной среды VectorEnv: выполняет команды из канала и пишет результаты в свою строку общей памяти.
+    Закончившийся эпизод сразу начинается заново, а последнее наблюдение эпизода отдается в info.
+    '''
+    memory = shared_memory.SharedMemory(name = memory_name)
+    observations, rewards, dones = shared_views(memory.buf, num_envs)
+    env = Env(**env_kwargs)
+    try:
+        while True:
+            command, argument = connection.recv()
+            if command == 'step':
+                observation, rewards[index], dones[index], info = env.step(argument)
+                if dones[index]:
+                    info['final_observation'] = observation
+                    env.reset()
+                env.observation(observations[index])
+                connection.send(info)
+            elif command == 'reset':
+                env.reset(argument)
+                env.observation(observations[index])
+                rewards[index], dones[index] = 0, False
+                connection.send(None)
+            elif command == 'close':
+                break
+    finally:
+        del observations, rewards, dones
+        memory.close()
+        connection.close()
+
+class VectorEnv:
+    '''
+    Класс VectorEnv - N независимых сред, каждая в своем процессе. Все среды получают действия одновременно
+    и шагают параллельно, поэтому пропускная способность растет с числом ядер.
+    Наблюдения лежат в общей памяти: step возвращает копии массивов (N, OBSERVATION_SIZE), (N,) и (N,).
+    '''
+    def __init__(self, num_envs, level = 0, seed = 0, frame_skip = 1, max_steps = None, start_method = 'spawn'):
+        '''
+        :param num_envs: Количество сред.
+        :type num_envs: int
+        :param level: Номер уровня.
+        :type level: int
+        :param seed: Базовый seed: среда с номером i получает seed + i.
+        :type seed: int
+        :param frame_skip: Шагов симуляции за один step.
+        :type frame_skip: int
+        :param max_steps: Лимит шагов эпизода.
+        :type max_steps: int
+        :param start_method: Способ запуска процессов multiprocessing.
+        :type start_method: str
+        '''
+        self.num_envs = num_envs
+        context = get_context(start_method)
+        self.memory = shared_memory.SharedMemory(create = True, size = shared_size(num_envs))
+        self.observations, self.rewards, self.dones = shared_views(self.memory.buf, num_envs)
+        self.connections, self.processes = [], []
+        for index in range(num_envs):
+            connection, child_connection = context.Pipe()
+            env_kwargs = {'level': level, 'seed': seed + index, 'frame_skip': frame_skip, 'max_steps': max_steps}
+            process = context.Process(target = worker, args = (index, self.memory.name, num_envs, child_connection, env_kwargs), daemon = True)
+            process.start()
+            child_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        self.closed = False
+
+    def __len__(self):
+        return self.num_envs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def reset(self, seeds = None):
+        '''
+        Начинает новые эпизоды во всех средах.
+
+        :param seeds: Seed'ы эпизодов для каждой среды или None.
+        :type seeds: list
+        :return: Наблюдения (N, OBSERVATION_SIZE).
+        :rtype: numpy.ndarray
+        '''
+        seeds = seeds if seeds is not None else [None] * self.num_envs
+        for connection, seed in zip(self.connections, seeds):
+            connection.send(('reset', seed))
+        for connection in self.connections:
+            connection.recv()
+        return self.observations.copy()
+
+    def step(self, actions):
+        '''
+        Выполняет по одному действию в каждой среде.
+
+        :param actions: Маски действий, по одной на среду.
+        :type actions: list
+        :return: Наблюдения, награды, флаги завершения и список info.
+        :rtype: tuple
+        '''
+        for connection, action in zip(self.connections, actions):
+            connection.send(('step', int(action)))
+        infos = [connection.recv() for connection in self.connections]
+        return self.observations.copy(), self.rewards.copy(), self.dones.copy(), infos
+
+    def close(self):
+        '''
+        Останавливает процессы и освобождает общую память.
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        for connection in self.connections:
+            try:
+                connection.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout = 5)
+            if process.is_alive():
+                process.terminate()
+        del self.observations, self.rewards, self.dones
+        self.memory.close()
+        self.memory.unlink()
@@ -1,4 +1,50 @@
 from settings import *
+from spatial import SpatialGrid
+from profiler import profiler
+from math import floor
+
+class StaticLayer:
+    '''
+    Класс StaticLayer хранит статичные тайлы одного z-слоя, заранее скомпонованные в чанки размером CHUNK_SIZE x CHUNK_SIZE.
+    Вместо тысяч отдельных спрайтов на экран выводятся только те чанки, которые попадают в камеру.
+    '''
+    def __init__(self):
+        self.chunks = {} # (cx, cy) -> pygame.Surface
+
+    def add(self, pos, surf):
+        '''
+        Впечатывает тайл в чанки, которые он покрывает.
+
+        :param pos: Позиция верхнего левого угла тайла на уровне.
+        :type pos: tuple
+        :param surf: Изображение тайла.
+        :type surf: pygame.Surface
+        '''
+        x, y = int(pos[0]), int(pos[1])
+        width, height = surf.get_size()
+        for cx in range(x // CHUNK_SIZE, (x + width - 1) // CHUNK_SIZE + 1):
+            for cy in range(y // CHUNK_SIZE, (y + height - 1) // CHUNK_SIZE + 1):
+                if (cx, cy) not in self.chunks:
+                    self.chunks[(cx, cy)] = pygame.Surface((CHUNK_SIZE, CHUNK_SIZE), pygame.SRCALPHA)
+                self.chunks[(cx, cy)].blit(surf, (x - cx * CHUNK_SIZE, y - cy * CHUNK_SIZE))
+
+    def draw(self, surface, offset):
+        '''
+        Отрисовывает чанки, пересекающиеся с окном, с учетом смещения камеры.
+
+        :param surface: Поверхность, на которой происходит отрисовка.
+        :type surface: pygame.Surface
+        :param offset: Смещение камеры.
+        :type offset: pygame.math.Vector2
+        '''
+        left, top = int(-offset.x) // CHUNK_SIZE, int(-offset.y) // CHUNK_SIZE
+        right, bottom = int(-offset.x + WIN_WIDTH) // CHUNK_SIZE, int(-offset.y + WIN_HEIGHT) // CHUNK_SIZE
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk:
+                    # floor, а не усечение: иначе чанки левее и выше экрана смещаются на пиксель
+                    surface.blit(chunk, (floor(cx * CHUNK_SIZE + offset.x), floor(cy * CHUNK_SIZE + offset.y)))
 
 class AllSprites(pygame.sprite.Group):
     '''
@@ -20,6 +66,21 @@ class AllSprites(pygame.sprite.Group):
         super().__init__()
         self.display_surface = pygame.display.get_surface()
         self.offset = vector() #смещение камеры
+        self.static_layers = {} # z -> StaticLayer
+        self.grids = {} # z -> SpatialGrid со спрайтами слоя
+        self.sprite_layers = {} # спрайт -> z, под которым он лежит в сетке
+        self.paths = SpatialGrid(CELL_SIZE) # спрайты с path_rect, разложенные по всей области их пути
+        self.pending = {} # спрайты, добавленные в группу, но еще не разложенные по сетке
+        self.sources = {} # z -> объекты с методом items(alpha), изображения которых рисуются поверх спрайтов слоя
+        self.z_order = [] # постоянный отсортированный список z-слоев
+        self.previous = {} # спрайт -> позиция до последнего шага симуляции, для интерполяции
+        self.order = {} # спрайт -> порядковый номер добавления, чтобы активные спрайты обновлялись в порядке группы
+        self.counter = 0
+        self.time = 0 # сколько секунд симуляции прошло
+        self.awake = set() # спрайты, обновленные на прошлом шаге
+        self.sleeping = {} # спрайт -> время, с которого он не обновлялся
+        self.active_rect = None # область уровня, в которой спрайты обновляются
+        self.frame = None # что было нарисовано в прошлом кадре (для отрисовки только изменений), ключ -> (изображение, позиция)
         self.width, self.height = width * TILE_SIZE, height * TILE_SIZE
         self.borders = {
 			'left': 0,
@@ -27,18 +88,184 @@ class AllSprites(pygame.sprite.Group):
 			'bottom': -self.height + WIN_HEIGHT,
 			'top': 0}
     
-    def camera_constraint(self):
+    def add_tile(self, pos, surf, z):
+        '''
+        Добавляет статичный тайл в чанки слоя z. Тайл не становится спрайтом и не обновляется.
+
+        :param pos: Позиция тайла на уровне.
+        :type pos: tuple
+        :param surf: Изображение тайла.
+        :type surf: pygame.Surface
+        :param z: Значение z-слоя.
+        :type z: int
+        '''
+        if z not in self.static_layers:
+            self.static_layers[z] = StaticLayer()
+            self.z_order = sorted(set(self.static_layers) | set(self.grids) | set(self.sources))
+        self.static_layers[z].add(pos, surf)
+
+    def add_source(self, z, source):
+        '''
+        Подключает источник изображений, которые не являются спрайтами группы (например, систему частиц).
+        Его изображения рисуются после спрайтов слоя z.
+
+        :param z: Значение z-слоя.
+        :type z: int
+        :param source: Объект с методом items(alpha), возвращающим список (изображение, (x, y)) в координатах уровня.
+        '''
+        self.sources.setdefault(z, []).append(source)
+        self.z_order = sorted(set(self.static_layers) | set(self.grids) | set(self.sources))
+
+    def add_internal(self, sprite, layer = None):
+        # спрайт добавляется в группы до того, как у него появятся rect и z,
+        # поэтому в сетку он попадает позже, в flush
+        super().add_internal(sprite, layer)
+        self.pending[sprite] = None
+        self.order[sprite] = self.counter
+        self.counter += 1
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.previous.pop(sprite, None)
+        self.order.pop(sprite, None)
+        self.sleeping.pop(sprite, None)
+        self.awake.discard(sprite)
+        if sprite in self.pending:
+            del self.pending[sprite]
+        else:
+            self.grids[self.sprite_layers.pop(sprite)].remove(sprite)
+            self.paths.remove(sprite)
+
+    def flush(self):
+        '''
+        Раскладывает недавно добавленные спрайты по сеткам их z-слоев.
+        '''
+        for sprite in self.pending:
+            if sprite.z not in self.grids:
+                self.grids[sprite.z] = SpatialGrid(CELL_SIZE)
+                self.z_order = sorted(set(self.static_layers) | set(self.grids) | set(self.sources))
+            self.grids[sprite.z].insert(sprite, sprite.rect)
+            self.sprite_layers[sprite] = sprite.z
+            if hasattr(sprite, 'path_rect'):
+                self.paths.insert(sprite, sprite.path_rect)
+            self.sleeping[sprite] = self.time # до первого обновления спрайт считается спящим
+        self.pending.clear()
+
+    def activation_rect(self, target_pos):
+        '''
+        Возвращает область уровня, в которой спрайты обновляются: то, что увидит камера с target_pos,
+        с запасом ACTIVATION_MARGIN с каждой стороны.
+        '''
+        offset = vector(-(target_pos[0] - WIN_WIDTH / 2), -(target_pos[1] - WIN_HEIGHT / 2))
+        self.camera_constraint(offset)
+        return pygame.FRect(-offset.x, -offset.y, WIN_WIDTH, WIN_HEIGHT).inflate(ACTIVATION_MARGIN * 2, ACTIVATION_MARGIN * 2)
+
+    def update(self, dt, target_pos = None):
+        '''
+        Обновляет спрайты и перекладывает в сетке те, что сместились в другие ячейки.
+        Позиции до шага запоминаются, чтобы отрисовка могла интерполировать между шагами.
+
+        Если задан target_pos (точка, за которой следит камера), обновляются только спрайты рядом с будущей областью камеры -
+        их дают ячейки сеток слоев, поэтому стоимость шага не растет с размером уровня. Остальные спрайты спят,
+        а проснувшись, догоняют пропущенное время методом fast_forward (если он есть) одним вызовом.
+        Спрайты с path_rect (движущиеся платформы и пилы) просыпаются, как только в область попадает любая часть их пути,
+        иначе спящий спрайт с длинным путем так и ждал бы игрока там, где уснул.
+
+        :param dt: Длительность шага в секундах.
+        :type dt: float
+        :param target_pos: Точка слежения камеры или None, чтобы обновить все спрайты.
+        :type target_pos: tuple
+        '''
+        self.flush()
+        now = self.time
+        self.time += dt
+        if target_pos is None:
+            sprites = self.sprites()
+        else:
+            self.active_rect = self.activation_rect(target_pos)
+            sprites = self.query(self.active_rect)
+            paths = self.paths.query(self.active_rect)
+            if paths:
+                found = dict.fromkeys(sprites)
+                found.update(dict.fromkeys(paths))
+                sprites = sorted(found, key = self.order.__getitem__)
+            awake = set(sprites)
+            for sprite in self.awake.difference(awake):
+                self.sleeping[sprite] = now
+            self.awake = awake
+
+        for sprite in sprites:
+            since = self.sleeping.pop(sprite, None)
+            if since is not None and now > since and hasattr(sprite, 'fast_forward'):
+                sprite.fast_forward(now - since)
+            self.previous[sprite] = sprite.rect.topleft
+            sprite.update(dt)
+            if sprite in self.sprite_layers:
+                self.grids[self.sprite_layers[sprite]].move(sprite, sprite.rect)
+
+    def query(self, rect):
+        '''
+        Возвращает спрайты всех слоев из ячеек сеток, которые покрывает rect, в порядке добавления в группу.
+        Это кандидаты: точную проверку пересечения выполняет вызывающий код.
+
+        :param rect: Прямоугольник запроса.
+        :type rect: pygame.FRect
+        :rtype: list
+        '''
+        self.flush()
+        found = {}
+        for grid in self.grids.values():
+            found.update(dict.fromkeys(grid.query(rect)))
+        return sorted(found, key = self.order.__getitem__)
+
+    def snapshot(self):
+        '''
+        Возвращает время и списки спящих и активных спрайтов для снимка уровня.
+        '''
+        return self.time, dict(self.sleeping), set(self.awake)
+
+    def restore(self, state, sprites):
+        '''
+        Восстанавливает состояние из snapshot после того, как уровень вернул спрайтам их позиции.
+        Интерполяция между шагами сбрасывается: прошлые позиции относятся к другому моменту.
+
+        :param state: Результат snapshot.
+        :type state: tuple
+        :param sprites: Сдвинутые спрайты, которые нужно переложить в сетке.
+        :type sprites: list
+        '''
+        self.time, sleeping, awake = state
+        self.sleeping, self.awake = dict(sleeping), set(awake)
+        self.previous.clear()
+        self.refresh(sprites)
+
+    def refresh(self, sprites):
+        '''
+        Перекладывает в сетке спрайты, которые были сдвинуты вне update (например, менеджером врагов).
+
+        :param sprites: Сдвинутые спрайты.
+        :type sprites: list
+        '''
+        for sprite in sprites:
+            if sprite in self.sprite_layers:
+                self.grids[self.sprite_layers[sprite]].move(sprite, sprite.rect)
+
+    def camera_constraint(self, offset = None):
         '''
         Проверяет и устанавливает смещение камеры для левой, правой, верхней и нижней границ.
+
+        :param offset: Смещение, которое нужно ограничить. По умолчанию - текущее смещение камеры.
+        :type offset: pygame.math.Vector2
         '''
-        self.offset.x = self.offset.x if self.offset.x < self.borders['left'] else self.borders['left']
-        self.offset.x = self.offset.x if self.offset.x > self.borders['right'] else self.borders['right'] 
-        self.offset.y = self.offset.y if self.offset.y > self.borders['bottom'] else self.borders['bottom']
-        self.offset.y = self.offset.y if self.offset.y < self.borders['top'] else self.borders['top']
+        offset = self.offset if offset is None else offset
+        offset.x = offset.x if offset.x < self.borders['left'] else self.borders['left']
+        offset.x = offset.x if offset.x > self.borders['right'] else self.borders['right'] 
+        offset.y = offset.y if offset.y > self.borders['bottom'] else self.borders['bottom']
+        offset.y = offset.y if offset.y < self.borders['top'] else self.borders['top']
           
-    def draw(self, target_pos):
+    def place_camera(self, target_pos):
         '''
-        Отрисовывает все спрайты на экране с учетом смещения камеры.
+        Устанавливает смещение камеры так, чтобы target был по центру экрана, не выходя за границы уровня.
 
         :param target_pos: Позиция target'а, за которой следует камера.
         :type target_pos: tuple
@@ -47,7 +274,191 @@ class AllSprites(pygame.sprite.Group):
         self.offset.y = -(target_pos[1] - WIN_HEIGHT / 2) # такое смещение по y, чтобы игрок был по центру экрана
         self.camera_constraint()
 
-        for sprite in sorted(self, key = lambda sprite: sprite.z):
-        # сортирует спрайты по слоям, чем больше значение z тем выше слой
-            offset_pos = sprite.rect.topleft + self.offset
-            self.display_surface.blit(sprite.image, offset_pos)
\ No newline at end of file
+    def collect(self, alpha):
+        '''
+        Собирает видимые изображения в порядке отрисовки.
+
+        :param alpha: Доля пройденного шага симуляции: 0 - позиция до шага, 1 - после.
+        :type alpha: float
+        :return: Словарь z -> список (ключ, изображение, позиция на экране). Ключ - спрайт или (источник, номер).
+        :rtype: dict
+        '''
+        # видимая область уровня с запасом на тайл: blit округляет дробные позиции,
+        # а интерполированная позиция может немного отставать от rect
+        camera_rect = pygame.FRect(-self.offset.x, -self.offset.y, WIN_WIDTH, WIN_HEIGHT).inflate(TILE_SIZE * 2, TILE_SIZE * 2)
+        self.flush()
+        lag = 1 - alpha
+        offset_x, offset_y = self.offset
+
+        layers = {}
+        for z in self.z_order:
+            items = layers[z] = []
+            if z in self.grids:
+                for sprite in self.grids[z].query(camera_rect):
+                    if sprite.rect.colliderect(camera_rect):
+                        x, y = sprite.rect.topleft
+                        if lag and sprite in self.previous:
+                            previous_x, previous_y = self.previous[sprite]
+                            x, y = x + (previous_x - x) * lag, y + (previous_y - y) * lag
+                        items.append((sprite, sprite.image, (x + offset_x, y + offset_y)))
+            for source in self.sources.get(z, ()):
+                for number, (image, (x, y)) in enumerate(source.items(alpha)):
+                    items.append(((source, number), image, (x + offset_x, y + offset_y)))
+        return layers
+
+    def render(self, layers, area = None):
+        '''
+        Рисует статичные чанки и собранные изображения. Если задана область, рисуются только
+        изображения, которые ее задевают, а остальная поверхность не меняется.
+
+        :param layers: Результат collect.
+        :type layers: dict
+        :param area: Область экрана или None для всего экрана.
+        :type area: pygame.Rect
+        '''
+        blit = self.display_surface.blit
+        # чем больше значение z тем выше слой
+        # статичные чанки слоя рисуются раньше спрайтов того же слоя, как раньше рисовались тайлы
+        for z in self.z_order:
+            if z in self.static_layers:
+                self.static_layers[z].draw(self.display_surface, self.offset)
+            for key, image, pos in layers[z]:
+                if area is None or area.colliderect(self.screen_rect(image, pos)):
+                    blit(image, pos)
+
+    @staticmethod
+    def screen_rect(image, pos):
+        '''
+        Возвращает область экрана, которую может занять изображение: с запасом в пиксель на округление позиции в blit.
+        '''
+        return pygame.Rect(floor(pos[0]) - 1, floor(pos[1]) - 1, image.get_width() + 2, image.get_height() + 2)
+
+    def draw(self, target_pos, alpha = 1):
+        '''
+        Отрисовывает все спрайты на экране с учетом смещения камеры.
+
+        :param target_pos: Позиция target'а, за которой следует камера.
+        :type target_pos: tuple
+        :param alpha: Доля пройденного шага симуляции: 0 - позиция до шага, 1 - после.
+        :type alpha: float
+        '''
+        self.place_camera(target_pos)
+        with profiler.section('draw.collect'):
+            layers = self.collect(alpha)
+        with profiler.section('draw.render'):
+            self.render(layers)
+        if self.frame is not None:
+            self.frame = {key: (image, pos) for items in layers.values() for key, image, pos in items}
+
+    def draw_changes(self, target_pos, alpha = 1, extra_rects = ()):
+        '''
+        Перерисовывает только области экрана, в которых что-то изменилось с прошлого кадра:
+        сдвинувшиеся, сменившие кадр, появившиеся и исчезнувшие изображения, а также дополнительные области.
+        Работает, только если камера стоит на месте, иначе меняется весь экран.
+
+        :param target_pos: Позиция target'а, за которой следует камера.
+        :type target_pos: tuple
+        :param alpha: Доля пройденного шага симуляции.
+        :type alpha: float
+        :param extra_rects: Дополнительные области экрана для перерисовки (например, изменившийся интерфейс).
+        :type extra_rects: list
+        :return: Список перерисованных областей или None, если нужна полная перерисовка (камера сдвинулась или это первый кадр).
+        :rtype: list
+        '''
+        previous_offset, previous_frame = self.offset.copy(), self.frame
+        self.place_camera(target_pos)
+        if previous_frame is None or self.offset != previous_offset:
+            self.frame = {} # полная перерисовка запомнит кадр
+            return None
+
+        layers = self.collect(alpha)
+        frame = {key: (image, pos) for items in layers.values() for key, image, pos in items}
+        rects = [pygame.Rect(rect) for rect in extra_rects]
+        for key, (image, pos) in frame.items():
+            previous = previous_frame.pop(key, None)
+            if previous != (image, pos):
+                rects.append(self.screen_rect(image, pos))
+                if previous:
+                    rects.append(self.screen_rect(*previous))
+        rects += [self.screen_rect(image, pos) for image, pos in previous_frame.values()] # исчезнувшие
+        self.frame = frame
+
+        rects = merge_rects(rects, self.display_surface.get_rect())
+        for rect in rects:
+            self.display_surface.set_clip(rect)
+            self.display_surface.fill(BACKGROUND_COLOR)
+            self.render(layers, rect)
+        self.display_surface.set_clip(None)
+        return rects
+
+def merge_rects(rects, bounds):
+    '''
+    Объединяет пересекающиеся прямоугольники и обрезает их по границам экрана.
+
+    :param rects: Прямоугольники.
+    :type rects: list
+    :param bounds: Границы экрана.
+    :type bounds: pygame.Rect
+    :rtype: list
+    '''
+    merged = []
+    for rect in rects:
+        rect = rect.clip(bounds)
+        if not rect.width or not rect.height:
+            continue
+        # прямоугольник поглощает все, с чем пересекается, пока пересечения не закончатся
+        index = rect.collidelist(merged)
+        while index >= 0:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+class CollisionSprites(pygame.sprite.Group):
+    '''
+    Класс CollisionSprites - группа спрайтов для столкновений с пространственным индексом.
+    Сетка выровнена по тайлам, поэтому запрос по хитбоксу затрагивает только соседние ячейки.
+    Движущиеся спрайты (с атрибутом moving) перекладываются в сетке перед каждым запросом.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.grid = SpatialGrid(TILE_SIZE)
+        self.pending = {} # спрайты, у которых еще может не быть rect
+        self.moving_sprites = {}
+
+    def add_internal(self, sprite, layer = None):
+        super().add_internal(sprite, layer)
+        self.pending[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        if sprite in self.pending:
+            del self.pending[sprite]
+        else:
+            self.grid.remove(sprite)
+            self.moving_sprites.pop(sprite, None)
+
+    def flush(self):
+        '''
+        Добавляет в сетку недавно созданные спрайты.
+        '''
+        for sprite in self.pending:
+            self.grid.insert(sprite, sprite.rect)
+            if hasattr(sprite, 'moving'):
+                self.moving_sprites[sprite] = None
+        self.pending.clear()
+
+    def query(self, rect):
+        '''
+        Возвращает спрайты из ячеек, которые покрывает rect, в порядке добавления в группу.
+        Проверку пересечения выполняет вызывающий код, как и при обходе всей группы.
+
+        :param rect: Прямоугольник запроса.
+        :type rect: pygame.FRect
+        :return: Список спрайтов-кандидатов.
+        :rtype: list
+        '''
+        self.flush()
+        for sprite in self.moving_sprites:
+            self.grid.move(sprite, sprite.rect)
+        return self.grid.query(rect)
@@ -1,28 +1,41 @@
 from settings import *
-from sprites import Sprite, AnimatedSprite, MovingSprite, Item, ParticleEffectSprite
+from sprites import Sprite, AnimatedSprite, MovingSprite, Item
+from particles import ParticleSystem
 from player import Player
-from groups import AllSprites
-from enemies import Slime
+from groups import AllSprites, CollisionSprites
+from enemies import Slime, SlimeManager
 from data import Data
+from timer import SimulationClock
+from profiler import profiler
+from terrain import TerrainGrid
+from random import Random
+from collections import deque
 
 class Level:
     '''
     Класс Level представляет собой уровень игры. Он управляет всеми спрайтами, столкновениями, взаимодействиями и обновлением состояния уровня.
     '''
-    def __init__(self, tmx_map, level_frames, data, switch_stage):
+    def __init__(self, tmx_map, level_frames, data, switch_stage, input_source = None, seed = None):
         '''
         :param tmx_map: Объект карты уровня, созданный с помощью библиотеки pytmx.
         :type tmx_map: pytmx.TiledMap
-        :param level_frames: Словарь с кадрами анимации для различных объектов уровня.
+        :param level_frames: Словарь с кадрами анимации для различных объектов уровня, в ключе 'flipped' - их отраженные копии.
         :type level_frames: dict
         :param data: Объект класса Data, содержащий данные игры (например, количество монет и здоровье).
         :type data: Data
         :param switch_stage: Функция для переключения на следующий уровень.
         :type switch_stage: function
+        :param input_source: Источник ввода игрока (клавиатура, реплей). По умолчанию клавиатура.
+        :param seed: Seed генератора случайных чисел уровня. Один и тот же seed дает одинаковое поведение врагов.
+        :type seed: int
         '''
         self.display_surface = pygame.display.get_surface()
         self.data = data
         self.switch_stage = switch_stage
+        self.input_source = input_source
+        self.random = Random(seed)
+        self.dead = False # игрок упал за нижнюю границу уровня
+        self.clock = SimulationClock() # время уровня для таймеров его объектов, идет только в update
 
         # level data
         self.level_width = tmx_map.width * TILE_SIZE
@@ -33,15 +46,28 @@ class Level:
             width = self.level_width,
             height = self.level_bottom
         )
-        self.collision_sprites = pygame.sprite.Group() # все сталкивающиеся спрайты
-        self.semi_collision_sprites = pygame.sprite.Group()
+        self.terrain = TerrainGrid(tmx_map.width, tmx_map.height) # занятые тайлы земли
+        self.collision_sprites = CollisionSprites() # остальные сталкивающиеся спрайты
+        self.semi_collision_sprites = CollisionSprites()
         self.damage_sprites = pygame.sprite.Group()
         self.slime_sprites = pygame.sprite.Group()
         self.item_sprites = pygame.sprite.Group()
 
         self.setup(tmx_map, level_frames)
 
+        # частицы не являются спрайтами: система обновляет их сама, а рисуются они поверх слоя frontground
         self.particle_frames = level_frames['particle']
+        self.particles = ParticleSystem()
+        self.all_sprites.add_source(Z_LAYERS['frontground'], self.particles)
+
+        # камера: точка слежения до и после последнего шага симуляции
+        self.camera_target = vector(self.player.hitbox_rect.center)
+        self.previous_camera_target = self.camera_target.copy()
+
+        # контрольные точки: снимки состояния раз в CHECKPOINT_INTERVAL секунд для возрождения и перемотки;
+        # первая записывается в start, когда игрок входит на уровень
+        self.checkpoints = deque(maxlen = CHECKPOINT_COUNT)
+        self.checkpoint_time = 0
 
     def setup(self, tmx_map, level_frames):
         '''
@@ -55,15 +81,17 @@ class Level:
         # тайлы
         for layer in ['Sky', 'Cloud', 'Lake', 'Terrain', 'Decoration']:
             for x, y, surf in tmx_map.get_layer_by_name(layer).tiles():
-                groups = [self.all_sprites]
-                if layer == 'Terrain': 
-                    groups.append(self.collision_sprites)
                 match layer:
                     case 'Sky': z = Z_LAYERS['background']
                     case 'Cloud': z = Z_LAYERS['background'] 
                     case 'Lake': z = Z_LAYERS['water']
                     case _: z = Z_LAYERS['main']
-                Sprite((x * TILE_SIZE, y * TILE_SIZE), surf, groups, z)
+                # статичные тайлы запекаются в чанки, а тайлы земли для столкновений отмечаются в карте занятости
+                self.all_sprites.add_tile((x * TILE_SIZE, y * TILE_SIZE), surf, z)
+                if layer == 'Terrain': 
+                    self.terrain.add(x, y)
+        # соседние тайлы земли объединяются в крупные прямоугольники столкновений, отрисовка остается потайловой
+        self.terrain.merge()
     
         # объекты
         for obj in tmx_map.get_layer_by_name('Object'):
@@ -71,19 +99,24 @@ class Level:
                 self.player = Player(
                     pos = (obj.x, obj.y), 
                     groups = self.all_sprites, 
+                    terrain = self.terrain,
                     collision_sprites = self.collision_sprites, 
                     semi_collision_sprites = self.semi_collision_sprites,
                     frames = level_frames['player'],
-                    data = self.data)
+                    flipped_frames = level_frames['flipped']['player'],
+                    data = self.data,
+                    clock = self.clock,
+                    input_source = self.input_source)
             elif obj.name != 'doors':
                 frames = level_frames[obj.name]
                 AnimatedSprite((obj.x, obj.y), frames, self.all_sprites, z = Z_LAYERS['background details'])
             if obj.name == 'doors':
                 self.level_finish_rect = pygame.FRect((obj.x, obj.y), (obj.width, obj.height))
                 frames = level_frames[obj.name]
-                Sprite((obj.x, obj.y), frames[0], groups, z = Z_LAYERS['background tiles'])
+                Sprite((obj.x, obj.y), frames[0], self.all_sprites, z = Z_LAYERS['background tiles'])
                     
         # движущиеся объекты
+        self.moving_sprites = []
         for obj in tmx_map.get_layer_by_name('Moving Objects'):
             frames = level_frames[obj.name]
             groups = (self.all_sprites, self.semi_collision_sprites) if obj.properties['platform'] else (self.all_sprites, self.damage_sprites)
@@ -98,40 +131,156 @@ class Level:
                 start_pos = (obj.x + obj.width / 2, obj.y)
                 end_pos = (obj.x + obj.width / 2, obj.y + obj.height)
             speed = obj.properties['speed']
-            MovingSprite(frames, groups, start_pos, end_pos, move_dir, speed)
+            self.moving_sprites.append(MovingSprite(frames, groups, start_pos, end_pos, move_dir, speed))
 
         # враги
+        self.slimes = SlimeManager(level_frames['slime'], level_frames['flipped']['slime'], self.terrain, self.random)
         for obj in tmx_map.get_layer_by_name('Enemies'):
             if obj.name == 'slime':
-                Slime((obj.x, obj.y), level_frames['slime'], (self.all_sprites, self.damage_sprites, self.slime_sprites), self.collision_sprites)
+                Slime((obj.x, obj.y), level_frames['slime'], (self.all_sprites, self.damage_sprites, self.slime_sprites), self.slimes)
 
         # предметы
         for obj in tmx_map.get_layer_by_name('Items'):
             Item(obj.name, (obj.x, obj.y), level_frames['items'][obj.name], (self.all_sprites, self.item_sprites), self.data)
 
-    def hit_collision(self):
+    def start(self):
+        '''
+        Вызывается, когда игрок входит на уровень: записывает первую контрольную точку.
+        В конструкторе этого делать нельзя - следующий уровень создается в фоне заранее,
+        и снимок запомнил бы монеты и хп на момент подготовки, а не входа.
+        '''
+        self.checkpoints.clear()
+        self.checkpoint_time = 0
+        self.checkpoints.append(self.snapshot())
+
+    def snapshot(self):
+        '''
+        Сохраняет состояние уровня: показания его часов, игрока, слаймов, платформы, оставшиеся предметы, Data и генератор случайных чисел.
+        Спрайты не копируются - снимок хранит ссылки на них и несколько чисел на каждый, поэтому он небольшой
+        и создается быстро.
+
+        :rtype: dict
+        '''
+        return {
+            'ticks': self.clock.get_ticks(),
+            'player': self.player.snapshot(),
+            'grounded': self.player.on_surface['floor'],
+            'slimes': self.slimes.snapshot(),
+            'platforms': [sprite.snapshot() for sprite in self.moving_sprites],
+            'items': self.item_sprites.sprites(),
+            'data': self.data.snapshot(),
+            'random': self.random.getstate(),
+            'sprites': self.all_sprites.snapshot()
+        }
+
+    def restore(self, snapshot):
+        '''
+        Возвращает уровень в состояние snapshot без пересоздания спрайтов: уничтоженные после снимка слаймы
+        и подобранные предметы возвращаются в свои группы, остальным спрайтам возвращаются позиции.
+
+        :param snapshot: Результат snapshot.
+        :type snapshot: dict
+        '''
+        # назад переводятся только часы этого уровня, чтобы таймеры игрока сработали на тех же шагах;
+        # таймеры интерфейса и других уровней идут по своим часам и перемотку не замечают
+        self.clock.ticks = snapshot['ticks']
+        for sprite in snapshot['slimes'][0]:
+            if not sprite.alive():
+                sprite.add(self.all_sprites, self.damage_sprites, self.slime_sprites)
+        self.slimes.restore(snapshot['slimes'])
+        for sprite in snapshot['items']:
+            if not sprite.alive():
+                sprite.add(self.all_sprites, self.item_sprites)
+        for sprite, state in zip(self.moving_sprites, snapshot['platforms']):
+            sprite.restore(state)
+        self.player.restore(snapshot['player'])
+        self.data.restore(snapshot['data'])
+        self.random.setstate(snapshot['random'])
+        self.all_sprites.restore(snapshot['sprites'], self.moving_sprites + self.slimes.sprites + [self.player])
+
+        self.particles.clear()
+        self.dead = False
+        self.checkpoint_time = 0
+        self.camera_target.update(self.player.hitbox_rect.center)
+        self.previous_camera_target.update(self.camera_target)
+
+    def respawn(self):
+        '''
+        Возвращает игрока к последней контрольной точке, в которой он стоял на земле, и отнимает одно сердце.
+        Более поздние снимки отбрасываются.
+        '''
+        health = self.data.health
+        while len(self.checkpoints) > 1 and not self.checkpoints[-1]['grounded']:
+            self.checkpoints.pop()
+        self.restore(self.checkpoints[-1])
+        self.data.health = health - 1
+
+    def rewind(self):
+        '''
+        Перематывает уровень на последнюю контрольную точку. Повторные вызовы уходят дальше в прошлое,
+        пока не останется самый старый снимок.
+        Перемотка никогда не возвращает сердца: потерянные от урона и за возрождение остаются потерянными,
+        а полученные после снимка (зелья, бонус за монеты) пропадают вместе с вернувшимися на уровень предметами.
+        '''
+        health = self.data.health
+        snapshot = self.checkpoints.pop() if len(self.checkpoints) > 1 else self.checkpoints[0]
+        self.restore(snapshot)
+        self.data.health = min(health, self.data.health)
+
+    def interactions(self):
+        '''
+        Находит кандидатов для всех взаимодействий игрока одним запросом к сеткам AllSprites:
+        они уже хранят актуальные позиции всех спрайтов, поэтому отдельный индекс не нужен.
+        Кандидаты раскладываются по видам взаимодействия в порядке добавления спрайтов в группы.
+
+        :return: Списки кандидатов (опасные объекты, предметы, цели атаки).
+        :rtype: tuple
+        '''
+        damage, items, targets = [], [], []
+        for sprite in self.all_sprites.query(self.player.rect.union(self.player.hitbox_rect)):
+            if sprite in self.damage_sprites:
+                damage.append(sprite)
+            if sprite in self.item_sprites:
+                items.append(sprite)
+            if sprite in self.slime_sprites:
+                targets.append(sprite)
+        return damage, items, targets
+
+    def hit_collision(self, candidates):
         '''
         Проверяет столкновения игрока с врагами и наносит урон, если столкновение произошло.
+        Повторный урон блокирует таймер игрока 'hit'.
+
+        :param candidates: Опасные объекты рядом с игроком.
+        :type candidates: list
         '''
-        for sprite in self.damage_sprites:
+        for sprite in candidates:
             if sprite.rect.colliderect(self.player.hitbox_rect):
                 self.player.get_damaged()
 
-    def item_collision(self):
+    def item_collision(self, candidates):
         '''
-        Проверяет столкновения игрока с предметами и активирует их, если столкновение произошло.
+        Проверяет столкновения игрока с предметами: все задетые предметы исчезают,
+        а активируется и оставляет частицу только первый из них.
+
+        :param candidates: Предметы рядом с игроком.
+        :type candidates: list
         '''
-        if self.item_sprites:
-            item_sprites = pygame.sprite.spritecollide(self.player, self.item_sprites, True)
-            if item_sprites:
-                item_sprites[0].activate()
-                ParticleEffectSprite((item_sprites[0].rect.topleft), self.particle_frames, self.all_sprites)
+        item_sprites = [sprite for sprite in candidates if sprite.rect.colliderect(self.player.rect)]
+        if item_sprites:
+            for sprite in item_sprites:
+                sprite.kill()
+            item_sprites[0].activate()
+            self.particles.emit(item_sprites[0].rect.topleft, self.particle_frames)
 
-    def attack_collision(self):
+    def attack_collision(self, candidates):
         '''
         Проверяет столкновения игрока с врагами при атаке и уничтожает врагов, если столкновение произошло.
+
+        :param candidates: Враги рядом с игроком.
+        :type candidates: list
         '''
-        for target in self.slime_sprites.sprites():
+        for target in candidates:
             facing_target = self.player.rect.centerx < target.rect.centerx and self.player.facing_right or \
                             self.player.rect.centerx > target.rect.centerx and not self.player.facing_right
             if target.rect.colliderect(self.player.rect) and self.player.attacking and facing_target:
@@ -147,26 +296,79 @@ class Level:
         if self.player.hitbox_rect.right >= self.level_width:
             self.player.hitbox_rect.right = self.level_width
 
-        # нижняя граница
+        # нижняя граница: уровень только отмечает гибель, а возрождает игрока (respawn) или заканчивает эпизод Game или среда
         if self.player.hitbox_rect.bottom > self.level_bottom:
-            pygame.quit()
-            sys.exit()
+            self.dead = True
+            return
 
         # завершение уровня
         if self.player.hitbox_rect.colliderect(self.level_finish_rect):
             self.data.current_level += 1
             self.switch_stage(self.data.current_level)
 
+    def update(self, dt):
+        '''
+        Выполняет один шаг симуляции уровня.
+
+        :param dt: Длительность шага в секундах.
+        :type dt: float
+        '''
+        self.previous_camera_target.update(self.camera_target)
+
+        section = profiler.section
+        with section('level.timers'):
+            self.clock.advance(dt)
+        with section('level.sprites'):
+            self.all_sprites.update(dt, self.camera_target)
+        with section('level.enemies'):
+            self.all_sprites.refresh(self.slimes.update(dt, self.all_sprites.active_rect))
+        with section('level.particles'):
+            self.particles.update(dt)
+        with section('level.interactions'):
+            damage, items, targets = self.interactions()
+        with section('level.hit'):
+            self.hit_collision(damage)
+        with section('level.items'):
+            self.item_collision(items)
+        with section('level.attack'):
+            self.attack_collision(targets)
+        with section('level.constraint'):
+            self.check_constraint()
+
+        self.camera_target.update(self.player.hitbox_rect.center)
+
+        self.checkpoint_time += dt
+        if self.checkpoint_time >= CHECKPOINT_INTERVAL and not self.dead:
+            with section('level.checkpoint'):
+                self.checkpoints.append(self.snapshot())
+            self.checkpoint_time = 0
+
+    def draw(self, alpha = 1, dirty = False, extra_rects = ()):
+        '''
+        Отрисовывает уровень, интерполируя позиции между двумя последними шагами симуляции.
+
+        :param alpha: Доля пройденного шага: 0 - состояние до шага, 1 - после.
+        :type alpha: float
+        :param dirty: Перерисовать только изменившиеся области, если камера не сдвинулась.
+        :type dirty: bool
+        :param extra_rects: Области экрана, которые нужно перерисовать в любом случае.
+        :type extra_rects: list
+        :return: Перерисованные области или None, если перерисован весь экран.
+        :rtype: list
+        '''
+        target_pos = self.camera_target.lerp(self.previous_camera_target, 1 - alpha)
+        if dirty:
+            with profiler.section('draw.changes'):
+                rects = self.all_sprites.draw_changes(target_pos, alpha, extra_rects)
+            if rects is not None:
+                return rects
+        with profiler.section('draw.fill'):
+            self.display_surface.fill(BACKGROUND_COLOR)
+        self.all_sprites.draw(target_pos, alpha)
+
     def run(self, dt):
         '''
         Запускает обновление и отрисовку уровня.
         '''
-        self.display_surface.fill((44, 156, 213))
-        
-        self.all_sprites.update(dt)
-        self.hit_collision()
-        self.item_collision()
-        self.attack_collision()
-        self.check_constraint()
-
-        self.all_sprites.draw(self.player.hitbox_rect.center)
\ No newline at end of file
+        self.update(dt)
+        self.draw()
\ No newline at end of file
@@ -0,0 +1,81 @@
+from settings import *
+from compiler import load_level
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+class LevelLoader:
+    '''
+    Класс LevelLoader загружает уровни по требованию.
+    Разобранные карты (но не созданные из них Level) хранятся в LRU-кеше ограниченного размера, а следующий уровень
+    (разбор карты и создание спрайтов) готовится в фоновом потоке, пока игрок проходит текущий.
+    В фоновом потоке нельзя обращаться к окну: ни карта, ни Level при создании не конвертируют изображения
+    под формат экрана (тайлы переводятся только в формат чанков), а кадры анимаций конвертируются заранее в основном потоке.
+    '''
+    def __init__(self, paths, build, capacity = MAP_CACHE_SIZE):
+        '''
+        :param paths: Пути к TMX-файлам уровней по порядку.
+        :type paths: list
+        :param build: Функция build(index, level_map), создающая Level по номеру и карте уровня.
+        :type build: function
+        :param capacity: Сколько разобранных карт держать в памяти. Подготовленные уровни сюда не входят:
+            каждый хранится только до того, как его заберет take.
+        :type capacity: int
+        '''
+        self.paths = paths
+        self.build = build
+        self.capacity = capacity
+        self.maps = OrderedDict() # номер уровня -> карта, от давно использованных к недавним
+        self.prepared = {} # номер уровня -> Future с готовым Level
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'level-loader')
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get_map(self, index):
+        '''
+        Возвращает разобранную карту уровня, загружая ее при необходимости.
+
+        :param index: Номер уровня.
+        :type index: int
+        '''
+        with self.lock:
+            if index in self.maps:
+                self.maps.move_to_end(index)
+                return self.maps[index]
+        level_map = load_level(self.paths[index])
+        with self.lock:
+            self.maps[index] = level_map
+            self.maps.move_to_end(index)
+            while len(self.maps) > self.capacity:
+                self.maps.popitem(last = False)
+        return level_map
+
+    def create(self, index):
+        return self.build(index, self.get_map(index))
+
+    def prepare(self, index):
+        '''
+        Начинает готовить уровень в фоновом потоке. Несуществующие номера игнорируются.
+
+        :param index: Номер уровня.
+        :type index: int
+        '''
+        if 0 <= index < len(self.paths) and index not in self.prepared:
+            self.prepared[index] = self.executor.submit(self.create, index)
+
+    def take(self, index):
+        '''
+        Возвращает новый Level: готовый из фонового потока, если он был подготовлен, иначе создает его сразу.
+        Подготовленный уровень отдается только один раз - повторный вход создает уровень заново.
+        Перед выдачей у уровня вызывается start: игрок входит на него сейчас.
+
+        :param index: Номер уровня.
+        :type index: int
+        :rtype: Level
+        '''
+        future = self.prepared.pop(index, None)
+        level = future.result() if future else self.create(index)
+        level.start()
+        return level
@@ -3,72 +3,228 @@ from support import *
 from level import Level
 from data import Data
 from ui import UI
-from pytmx.util_pygame import load_pygame
+from controls import KeyboardInput, ReplayRecorder, ReplayInput, REWIND_KEY
+from loader import LevelLoader
+from atlas import load_atlas
+from profiler import profiler
+from os import environ
 from os.path import join
+from random import randrange
+from time import perf_counter
+import argparse
 
+LEVEL_PATHS = [join('Levels', 'level1.tmx'), join('Levels', 'level2.tmx')]
+
+def load_assets():
+    '''
+    Загружает изображения игры. Кадры анимаций упакованы в атлас; тайлсеты уровней загружаются вместе с картами.
+
+    Возвращает:
+    - tuple: Атлас, кадры объектов уровня (в ключе 'flipped' - их отраженные копии) и кадры интерфейса.
+    '''
+    atlas = load_atlas('Assets', CACHE_FOLDER, exclude = ('Tiles', 'cache'))
+    level_frames = {
+        'doors': import_folder('Assets/Doors', atlas = atlas),
+        'saw': import_folder('Assets/Saw', atlas = atlas),
+        'player': import_sub_folders('Assets/Player', atlas = atlas),
+        'flying platform': import_folder('Assets/Flying_platform', atlas = atlas),
+        'slime': import_folder('Assets/Slime', atlas = atlas),
+        'items': import_sub_folders('Assets/Items', atlas = atlas),
+        'particle': import_folder('Assets/Particle', atlas = atlas)
+    }
+    # банк отраженных кадров для всех наборов анимаций: спрайты, смотрящие влево, только выбирают кадр
+    level_frames['flipped'] = flip_frames(dict(level_frames), atlas)
+
+    ui_frames = {
+        'heart': import_folder('Assets/UI/Heart', atlas = atlas),
+        'coin': import_image('Assets/UI/Coin', atlas = atlas)
+    }
+    return atlas, level_frames, ui_frames
 
 class Game:
     '''
     Класс Game представляет собой основной класс игры. Он инициализирует все необходимые компоненты
     '''
-    def __init__(self):
+    def __init__(self, headless = False, seed = None, input_source = None, dirty_rects = False, level = 0):
+        '''
+        :param headless: Запуск без окна: карты и ресурсы загружаются, уровень симулируется, но ничего не отрисовывается.
+        :type headless: bool
+        :param seed: Seed генератора случайных чисел. По умолчанию выбирается случайно.
+        :type seed: int
+        :param input_source: Источник ввода игрока (клавиатура, запись или воспроизведение реплея).
+        :param dirty_rects: Перерисовывать и отправлять на экран только изменившиеся области, пока камера стоит на месте.
+        :type dirty_rects: bool
+        :param level: Номер уровня, с которого начинается игра. По умолчанию 0.
+        :type level: int
+        '''
+        self.headless = headless
+        self.dirty_rects = dirty_rects
+        if headless:
+            environ.setdefault('SDL_VIDEODRIVER', 'dummy') # клавиатура и события работают без X-сервера и GPU
         pygame.init()
-        self.display_surface = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
-        pygame.display.set_caption('Purple Bunny Game')
+        if not headless:
+            self.display_surface = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+            pygame.display.set_caption('Purple Bunny Game')
         self.clock = pygame.time.Clock()
         self.import_assets()
 
+        self.seed = seed if seed is not None else randrange(2 ** 32)
+        self.input_source = input_source or KeyboardInput()
+
         self.ui = UI(self.font, self.ui_frames)
         self.data = Data(self.ui)
-        self.tmx_maps = {0: load_pygame('Levels/level1.tmx'),
-                         1: load_pygame('Levels/level2.tmx')}
-        self.current_stage = Level(self.tmx_maps[self.data.current_level], self.level_frames, self.data, self.switch_stage)
+        self.data.current_level = level
+        self.levels = LevelLoader(LEVEL_PATHS, self.create_stage)
+        self.current_stage = self.levels.take(self.data.current_level)
+        self.levels.prepare(self.data.current_level + 1)
 
     def import_assets(self):
-        self.level_frames = {
-            'doors': import_folder('Assets/Doors'),
-            'saw': import_folder('Assets/Saw'),
-            'player': import_sub_folders('Assets/Player'),
-            'flying platform': import_folder('Assets/Flying_platform'),
-            'slime': import_folder('Assets/Slime'),
-            'items': import_sub_folders('Assets/Items'),
-            'particle': import_folder('Assets/Particle')
-        }
-
+        self.atlas, self.level_frames, self.ui_frames = load_assets()
         self.font = pygame.font.Font('Assets/Font/1.ttf', 30)
-        self.ui_frames = {
-            'heart': import_folder('Assets/UI/Heart'),
-            'coin': import_image('Assets/UI/Coin')
-        }
+        self.profiler_font = pygame.font.Font(None, 18)
+
+    def create_stage(self, index, level_map):
+        '''
+        Создает уровень. Seed уровня зависит от его номера, чтобы уровни не повторяли друг друга.
+        Может вызываться из фонового потока LevelLoader, поэтому не должна конвертировать изображения под формат экрана.
+
+        :param index: Номер уровня.
+        :type index: int
+        :param level_map: Карта уровня.
+        :type level_map: compiler.CompiledLevel
+        '''
+        return Level(level_map, self.level_frames, self.data, self.switch_stage, self.input_source, self.seed + index)
 
     def switch_stage(self, current_level = 0):
         '''
-        Переключает на следующий уровень.
+        Переключает на следующий уровень. Обычно он уже подготовлен в фоне, и переключение не вызывает задержки.
 
         :param current_level: Текущий уровень, по умолчанию 0.
         :type current_level: int
         '''
-        self.current_stage = Level(self.tmx_maps[self.data.current_level], self.level_frames, self.data, self.switch_stage)
+        self.current_stage = self.levels.take(self.data.current_level)
+        self.levels.prepare(self.data.current_level + 1)
 
     def check_game_over(self):
+        '''
+        Возрождает упавшего игрока на контрольной точке и завершает игру, когда заканчиваются сердца.
+        '''
+        if self.current_stage.dead:
+            self.current_stage.respawn()
         if self.data.health <= 0:
             pygame.quit()
             sys.exit()
 
     def run(self):
+        '''
+        Главный цикл: симуляция идет фиксированными шагами FIXED_DT, а отрисовка - с частотой не выше FPS
+        и с интерполяцией между двумя последними шагами.
+        '''
+        accumulator = 0
+        full_redraw = False # кадр после скрытия оверлея профайлера перерисовывается целиком
+        section = profiler.section
         while True:
-            dt = self.clock.tick() / 1000
+            with section('frame.wait'):
+                frame_time = self.clock.tick(FPS) / 1000
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    profiler.toggle()
+                    full_redraw = True
+                # перемотка меняет состояние уровня вне записанного ввода, поэтому при записи и воспроизведении реплея она отключена
+                if event.type == pygame.KEYDOWN and event.key == REWIND_KEY and isinstance(self.input_source, KeyboardInput):
+                    self.current_stage.rewind()
+                    full_redraw = True
             
-            self.check_game_over()
-            self.current_stage.run(dt)
-            self.ui.update(dt)
+            with section('frame.simulation'):
+                accumulator += frame_time
+                steps = 0
+                while accumulator >= FIXED_DT:
+                    if steps == MAX_STEPS:
+                        # симуляция не успевает за реальным временем - отбрасываем отставание
+                        accumulator = 0
+                        break
+                    self.check_game_over()
+                    self.current_stage.update(FIXED_DT)
+                    accumulator -= FIXED_DT
+                    steps += 1
+
+            with section('ui.update'):
+                self.ui.update(frame_time)
+            # оверлей профайлера рисуется поверх всего экрана, поэтому с ним кадр всегда перерисовывается целиком
+            dirty = self.dirty_rects and not profiler.enabled and not full_redraw
+            full_redraw = False
+            with section('level.draw'):
+                rects = self.current_stage.draw(accumulator / FIXED_DT, dirty, self.ui.changed)
+            self.ui.draw(rects)
+            if profiler.enabled:
+                profiler.draw(self.display_surface, self.profiler_font)
 
-            pygame.display.update()
+            # в режиме перерисовки изменений на экран отправляются только перерисованные области
+            with section('frame.display'):
+                if rects is None:
+                    pygame.display.update()
+                elif rects:
+                    pygame.display.update(rects)
+
+    def simulate(self, steps):
+        '''
+        Симулирует уровень без отрисовки так быстро, как позволяет процессор.
+
+        :param steps: Количество шагов длительностью FIXED_DT.
+        :type steps: int
+        :return: Количество выполненных шагов (меньше steps, если у игрока закончились сердца).
+        :rtype: int
+        '''
+        for step in range(steps):
+            if self.current_stage.dead:
+                self.current_stage.respawn()
+            if self.data.health <= 0:
+                return step
+            self.current_stage.update(FIXED_DT)
+        return steps
 
 if __name__ == '__main__':
-    game = Game()  
-    game.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description = 'Purple Bunny Game')
+    parser.add_argument('--headless', action = 'store_true', help = 'симуляция без окна и отрисовки')
+    parser.add_argument('--steps', type = int, help = 'количество шагов симуляции в headless-режиме')
+    parser.add_argument('--seed', type = int, help = 'seed генератора случайных чисел')
+    parser.add_argument('--level', type = int, default = 0, help = 'номер уровня, с которого начинается игра')
+    parser.add_argument('--record', metavar = 'PATH', help = 'записать ввод в файл реплея')
+    parser.add_argument('--replay', metavar = 'PATH', help = 'воспроизвести ввод из файла реплея')
+    parser.add_argument('--profile', metavar = 'PATH', help = 'включить профайлер и сохранить статистику фаз кадра в CSV или JSON')
+    parser.add_argument('--dirty-rects', action = 'store_true', help = 'обновлять на экране только изменившиеся области (для слабых устройств)')
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else randrange(2 ** 32)
+    level = args.level
+    if not 0 <= level < len(LEVEL_PATHS):
+        parser.error(f'номер уровня должен быть от 0 до {len(LEVEL_PATHS) - 1}')
+    input_source = KeyboardInput()
+    if args.replay:
+        # реплей воспроизводится с того же seed и уровня, с которых он записан
+        input_source = ReplayInput(args.replay)
+        seed, level = input_source.seed, input_source.level
+    if args.record:
+        input_source = ReplayRecorder(input_source, seed, level)
+
+    if args.profile:
+        profiler.enabled = True
+    game = Game(headless = args.headless, seed = seed, input_source = input_source, dirty_rects = args.dirty_rects, level = level)
+    try:
+        if args.headless:
+            steps = args.steps or (input_source.steps if args.replay else 60 * 120)
+            start = perf_counter()
+            steps = game.simulate(steps)
+            elapsed = perf_counter() - start
+            print(f'steps: {steps}, simulated: {steps * FIXED_DT:.1f}s, real: {elapsed:.2f}s, '
+                  f'level: {game.data.current_level}, coins: {game.data.coins}, health: {game.data.health}')
+        else:
+            game.run()
+    finally:
+        if args.record:
+            input_source.save(args.record)
+        if args.profile:
+            profiler.export(args.profile)
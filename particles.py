@@ -0,0 +1,133 @@
+from settings import *
+
+class Pool:
+    '''
+    Класс Pool - пул переиспользуемых объектов. Вместо создания и удаления короткоживущих объектов
+    (частиц, вспышек) они берутся из списка свободных и возвращаются в него, поэтому во время игры
+    не создается мусор для сборщика.
+    '''
+    def __init__(self, factory, size = 0):
+        '''
+        :param factory: Функция без аргументов, создающая новый объект, когда свободных не осталось.
+        :type factory: function
+        :param size: Сколько объектов создать заранее.
+        :type size: int
+        '''
+        self.factory = factory
+        self.free = [factory() for _ in range(size)]
+
+    def __len__(self):
+        return len(self.free)
+
+    def acquire(self):
+        '''
+        Возвращает свободный объект из пула или новый, если пул пуст.
+        '''
+        return self.free.pop() if self.free else self.factory()
+
+    def release(self, item):
+        '''
+        Возвращает объект в пул.
+        '''
+        self.free.append(item)
+
+class Particle:
+    '''
+    Легковесная запись частицы: только данные, без групп спрайтов и rect.
+    '''
+    __slots__ = ('frames', 'frame_index', 'animation_speed', 'x', 'y', 'previous_x', 'previous_y', 'velocity_x', 'velocity_y', 'gravity')
+
+    def __init__(self):
+        self.frames = ()
+        self.frame_index = 0
+        self.animation_speed = ANIMATION_SPEED
+        self.x = self.y = self.previous_x = self.previous_y = 0
+        self.velocity_x = self.velocity_y = self.gravity = 0
+
+class ParticleSystem:
+    '''
+    Класс ParticleSystem обновляет все живые частицы уровня за один проход и отдает их кадры на отрисовку одним списком.
+    Частица проигрывает свою анимацию один раз и возвращается в пул. Скорость и гравитация позволяют
+    делать разлетающиеся эффекты (россыпь монет, искры от удара) без отдельных спрайтов.
+    '''
+    def __init__(self, pool_size = PARTICLE_POOL_SIZE):
+        '''
+        :param pool_size: Сколько частиц создать заранее.
+        :type pool_size: int
+        '''
+        self.pool = Pool(Particle, pool_size)
+        self.particles = []
+
+    def __len__(self):
+        return len(self.particles)
+
+    def emit(self, pos, frames, velocity = (0, 0), gravity = 0, animation_speed = ANIMATION_SPEED):
+        '''
+        Запускает частицу.
+
+        :param pos: Позиция верхнего левого угла (x, y).
+        :type pos: tuple
+        :param frames: Кадры анимации частицы.
+        :type frames: list
+        :param velocity: Начальная скорость в пикселях в секунду.
+        :type velocity: tuple
+        :param gravity: Ускорение по y в пикселях в секунду за секунду.
+        :type gravity: float
+        :param animation_speed: Скорость анимации в кадрах в секунду.
+        :type animation_speed: float
+        :rtype: Particle
+        '''
+        particle = self.pool.acquire()
+        particle.frames, particle.frame_index, particle.animation_speed = frames, 0, animation_speed
+        particle.x, particle.y = particle.previous_x, particle.previous_y = pos
+        particle.velocity_x, particle.velocity_y = velocity
+        particle.gravity = gravity
+        self.particles.append(particle)
+        return particle
+
+    def update(self, dt):
+        '''
+        Продвигает анимацию и движение всех частиц. Частицы с законченной анимацией возвращаются в пул,
+        а оставшиеся сдвигаются к началу того же списка.
+        '''
+        particles, pool = self.particles, self.pool
+        alive = 0
+        for particle in particles:
+            particle.frame_index += particle.animation_speed * dt
+            if particle.frame_index >= len(particle.frames):
+                pool.release(particle)
+                continue
+            particle.previous_x, particle.previous_y = particle.x, particle.y
+            if particle.velocity_x or particle.velocity_y or particle.gravity:
+                particle.velocity_y += particle.gravity * dt
+                particle.x += particle.velocity_x * dt
+                particle.y += particle.velocity_y * dt
+            particles[alive] = particle
+            alive += 1
+        del particles[alive:]
+
+    def clear(self):
+        '''
+        Возвращает все частицы в пул.
+        '''
+        for particle in self.particles:
+            self.pool.release(particle)
+        self.particles.clear()
+
+    def items(self, alpha = 1):
+        '''
+        Возвращает текущие кадры частиц и их позиции на уровне. Их рисует AllSprites вместе со спрайтами слоя.
+
+        :param alpha: Доля пройденного шага симуляции для интерполяции позиций.
+        :type alpha: float
+        :return: Список (изображение, (x, y)).
+        :rtype: list
+        '''
+        lag = 1 - alpha
+        items = []
+        for particle in self.particles:
+            x, y = particle.x, particle.y
+            if lag:
+                x, y = x + (particle.previous_x - x) * lag, y + (particle.previous_y - y) * lag
+            items.append((particle.frames[int(particle.frame_index)], (x, y)))
+        return items
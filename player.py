@@ -1,27 +1,105 @@
 from settings import *
 from timer import Timer
+from controls import KeyboardInput, RIGHT, LEFT, DOWN, ATTACK, JUMP
+
+class ContactSensor:
+    '''
+    Класс ContactSensor проверяет касание хитбокса с полом, стенами и движущимися платформами.
+    Прямоугольники-щупы создаются один раз и переиспользуются. Земля проверяется по карте занятости тайлов,
+    а спрайты - одним запросом к сетке каждой группы столкновений.
+    '''
+    def __init__(self, terrain, collision_sprites, semi_collision_sprites):
+        '''
+        :param terrain: Карта занятых тайлов земли.
+        :type terrain: TerrainGrid
+        :param collision_sprites: Группа объектов с полными коллизиями.
+        :param semi_collision_sprites: Группа объектов с частичными коллизиями (платформы).
+        '''
+        self.terrain = terrain
+        self.collision_sprites = collision_sprites
+        self.semi_collision_sprites = semi_collision_sprites
+        self.floor_rect = pygame.Rect(0, 0, 0, 0)
+        self.right_rect = pygame.Rect(0, 0, 0, 0)
+        self.left_rect = pygame.Rect(0, 0, 0, 0)
+        self.area_rect = pygame.Rect(0, 0, 0, 0)
+
+    def place_probes(self, hitbox):
+        '''
+        Располагает щупы вокруг хитбокса: полоса под ногами и полосы по бокам на средней половине высоты.
+        '''
+        self.floor_rect.update(hitbox.left, hitbox.bottom, hitbox.width, 2)
+        self.right_rect.update(hitbox.right, hitbox.top + hitbox.height / 4, 2, hitbox.height / 2)
+        self.left_rect.update(hitbox.left - 2, hitbox.top + hitbox.height / 4, 2, hitbox.height / 2)
+        self.area_rect.update(self.floor_rect)
+        self.area_rect.union_ip(self.right_rect)
+        self.area_rect.union_ip(self.left_rect)
+
+    def sense(self, hitbox, falling, on_surface):
+        '''
+        Заполняет словарь on_surface и возвращает движущуюся платформу под ногами (или None).
+
+        :param hitbox: Хитбокс игрока.
+        :type hitbox: pygame.FRect
+        :param falling: True, если игрок не движется вверх - только тогда платформы считаются полом.
+        :type falling: bool
+        :param on_surface: Словарь касаний {'floor', 'left', 'right'}, который будет обновлен.
+        :type on_surface: dict
+        :return: Платформа, на которой стоит игрок.
+        '''
+        self.place_probes(hitbox)
+        floor = self.terrain.solid_box(self.floor_rect)
+        right = self.terrain.solid_box(self.right_rect)
+        left = self.terrain.solid_box(self.left_rect)
+        platform = None
+
+        moving_sprites = self.collision_sprites.moving_sprites
+        for sprite in self.collision_sprites.query(self.area_rect):
+            if sprite.rect.colliderect(self.floor_rect):
+                floor = True
+                if sprite in moving_sprites:
+                    platform = sprite
+            if not right and sprite.rect.colliderect(self.right_rect):
+                right = True
+            if not left and sprite.rect.colliderect(self.left_rect):
+                left = True
+
+        moving_sprites = self.semi_collision_sprites.moving_sprites
+        for sprite in self.semi_collision_sprites.query(self.floor_rect):
+            if sprite.rect.colliderect(self.floor_rect):
+                floor = floor or falling
+                if sprite in moving_sprites:
+                    platform = sprite
+
+        on_surface['floor'], on_surface['left'], on_surface['right'] = floor, left, right
+        return platform
 
 class Player(pygame.sprite.Sprite):
     '''
     Класс игрока.
     '''
-    def __init__(self, pos, groups, collision_sprites, semi_collision_sprites, frames, data):
+    def __init__(self, pos, groups, terrain, collision_sprites, semi_collision_sprites, frames, flipped_frames, data, clock, input_source = None):
         '''
         Инициализирует объект игрока.
 
         :param pos: Позиция игрока.
         :param groups: Группы, к которым принадлежит игрок.
+        :param terrain: Карта занятых тайлов земли (TerrainGrid).
         :param collision_sprites: Список объектов, с которыми возможны полные коллизии.
         :param semi_collision_sprites: Список объектов, с которыми возможны частичные коллизии (например, платформы).
         :param frames: Словарь кадров для анимаций игрока.
+        :param flipped_frames: Те же кадры, отраженные по горизонтали (игрок смотрит влево).
         :param data: Дополнительные данные о состоянии игрока (например, здоровье).
+        :param clock: Часы симуляции уровня, по которым идут таймеры игрока.
+        :param input_source: Источник ввода с методом read(), возвращающим маску действий. По умолчанию клавиатура.
         '''
         super().__init__(groups)
         self.z = Z_LAYERS['main']
         self.data = data
+        self.input_source = input_source or KeyboardInput()
 
         # image
         self.frames, self.frame_index = frames, 0
+        self.flipped_frames = flipped_frames
         self.state, self.facing_right = 'Idle', True
         self.image = self.frames[self.state][self.frame_index]
 
@@ -40,18 +118,20 @@ class Player(pygame.sprite.Sprite):
         self.damaged = False
 
         # столкновения
+        self.terrain = terrain
         self.collision_sprites = collision_sprites
         self.semi_collision_sprites = semi_collision_sprites
         self.on_surface = {'floor': False, 'left': False, 'right': False}
         self.platform = None
+        self.contact_sensor = ContactSensor(terrain, collision_sprites, semi_collision_sprites)
 
         # таймер
         self.timers = {
-            'wall jump': Timer(200),
-            'wall slide block': Timer (200),
-            'platform skip': Timer(100),
-            'attack block': Timer(500),
-            'hit': Timer(600)
+            'wall jump': Timer(200, clock = clock),
+            'wall slide block': Timer (200, clock = clock),
+            'platform skip': Timer(100, clock = clock),
+            'attack block': Timer(500, clock = clock),
+            'hit': Timer(600, clock = clock)
         }
 
     def attack(self):
@@ -67,27 +147,27 @@ class Player(pygame.sprite.Sprite):
         '''
         Обрабатывает пользовательский ввод для перемещения, прыжков и атак.
         '''
-        keys = pygame.key.get_pressed()
+        actions = self.input_source.read()
         input_vector = vector(0, 0)
         if not self.timers['wall jump'].active:
             
-            if keys[pygame.K_RIGHT]:
+            if actions & RIGHT:
                 input_vector.x += 1
                 self.facing_right = True
             
-            if keys[pygame.K_LEFT]:
+            if actions & LEFT:
                 input_vector.x -= 1
                 self.facing_right = False
             
-            if keys[pygame.K_DOWN]:
+            if actions & DOWN:
                 self.timers['platform skip'].activate()
             
-            if keys[pygame.K_SPACE]:
+            if actions & ATTACK:
                 self.attack()
 
             self.direction.x = input_vector.normalize().x if input_vector else input_vector.x
         
-        if keys[pygame.K_UP]:
+        if actions & JUMP:
             self.jump = True
 
     def move(self, dt):
@@ -140,26 +220,26 @@ class Player(pygame.sprite.Sprite):
         '''
         Проверяет контакт игрока с поверхностями и платформами
         '''
-        floor_rect = pygame.Rect(self.hitbox_rect.bottomleft, (self.hitbox_rect.width, 2))
-        right_rect = pygame.Rect(self.hitbox_rect.topright + vector(0,self.hitbox_rect.height/4), (2, self.hitbox_rect.height / 2))
-        left_rect = pygame.Rect(self.hitbox_rect.topleft + vector(-2,self.hitbox_rect.height/4), (2, self.hitbox_rect.height / 2))
-    
-        
-        collide_rects = [sprite.rect for sprite in self.collision_sprites]
-        semi_collide_rect = [sprite.rect for sprite in self.semi_collision_sprites]
-
+        self.platform = self.contact_sensor.sense(self.hitbox_rect, self.direction.y >= 0, self.on_surface)
 
-        # collisions
-        self.on_surface['floor'] = True if floor_rect.collidelist(collide_rects) >= 0 or floor_rect.collidelist(semi_collide_rect) >= 0 and self.direction.y >= 0 else False
-        self.on_surface['right'] = True if right_rect.collidelist(collide_rects) >= 0 else False
-        self.on_surface['left'] = True if left_rect.collidelist(collide_rects) >= 0 else False
+    def reach_rect(self):
+        '''
+        Возвращает область, в пределах которой хитбокс может оказаться во время разрешения столкновений.
+        Выталкивание смещает хитбокс не больше чем на его размер, поэтому спрайты вне этой области
+        не могут повлиять на результат, и запрос к сетке дает тот же итог, что и обход всей группы.
+        '''
+        return self.hitbox_rect.inflate(self.hitbox_rect.width * 2, self.hitbox_rect.height * 2)
 
-        # движение игрока на передвигающейся платформе
-        self.platform = None
-        sprites = self.collision_sprites.sprites() + self.semi_collision_sprites.sprites()
-        for sprite in [sprite for sprite in sprites if hasattr(sprite, 'moving')]:
-            if sprite.rect.colliderect(floor_rect):
-                self.platform = sprite
+    def obstacles(self):
+        '''
+        Возвращает препятствия рядом с игроком как кортежи (rect, old_rect, moving):
+        сначала блоки земли из карты занятости (они неподвижны, поэтому old_rect совпадает с rect),
+        затем спрайты с полными коллизиями.
+        '''
+        area = self.reach_rect()
+        obstacles = [(rect, rect, False) for rect in self.terrain.rects(area)]
+        obstacles += [(sprite.rect, sprite.old_rect, hasattr(sprite, 'moving')) for sprite in self.collision_sprites.query(area)]
+        return obstacles
 
     def collision(self, axis):
         '''
@@ -167,26 +247,26 @@ class Player(pygame.sprite.Sprite):
 
         :param axis: Ось столкновения ('horizontal' или 'vertical').
         '''
-        for sprite in self.collision_sprites:
-            if sprite.rect.colliderect(self.hitbox_rect): #проверка коллизий между объектами, где self.rect - игрок
+        for rect, old_rect, moving in self.obstacles():
+            if rect.colliderect(self.hitbox_rect): #проверка коллизий между объектами, где self.rect - игрок
                 if axis == 'horizontal':
                     # left
-                    if self.hitbox_rect.left <= sprite.rect.right and int(self.old_rect.left) >= int(sprite.old_rect.right): # если левое плечо игрока ушло за правый край стены
-                        self.hitbox_rect.left = sprite.rect.right # то левое плечо должно находится вровень к правой стене
+                    if self.hitbox_rect.left <= rect.right and int(self.old_rect.left) >= int(old_rect.right): # если левое плечо игрока ушло за правый край стены
+                        self.hitbox_rect.left = rect.right # то левое плечо должно находится вровень к правой стене
                     
                     # right
-                    if self.hitbox_rect.right >= sprite.rect.left and int(self.old_rect.right) <= int(sprite.old_rect.left):
-                        self.hitbox_rect.right = sprite.rect.left
+                    if self.hitbox_rect.right >= rect.left and int(self.old_rect.right) <= int(old_rect.left):
+                        self.hitbox_rect.right = rect.left
 
                 else: # vertical collision
                     # bottom
-                    if self.hitbox_rect.bottom >= sprite.rect.top and int(self.old_rect.bottom) <= int(sprite.old_rect.top):
-                        self.hitbox_rect.bottom = sprite.rect.top
+                    if self.hitbox_rect.bottom >= rect.top and int(self.old_rect.bottom) <= int(old_rect.top):
+                        self.hitbox_rect.bottom = rect.top
                         
                     # top
-                    if self.hitbox_rect.top <= sprite.rect.bottom and int(self.old_rect.top) >= int(sprite.old_rect.bottom):
-                        self.hitbox_rect.top = sprite.rect.bottom
-                        if hasattr(sprite, 'moving'):
+                    if self.hitbox_rect.top <= rect.bottom and int(self.old_rect.top) >= int(old_rect.bottom):
+                        self.hitbox_rect.top = rect.bottom
+                        if moving:
                             self.hitbox_rect.top += 6 # для того, чтобы головой не проникать внутрь движущейся платформы
                     self.direction.y = 0
 
@@ -195,17 +275,13 @@ class Player(pygame.sprite.Sprite):
         Обрабатывает столкновения игрока с движущимися платформами.
         '''
         if not self.timers['platform skip'].active:
-            for sprite in self.semi_collision_sprites:
+            for sprite in self.semi_collision_sprites.query(self.reach_rect()):
                 if sprite.rect.colliderect(self.hitbox_rect):
                     if self.hitbox_rect.bottom >= sprite.rect.top and int(self.old_rect.bottom) <= sprite.old_rect.top:
                             self.hitbox_rect.bottom = sprite.rect.top
                             if self.direction.y > 0: # так игрок не липнет моментально к полу полу после запрыгивания на платформу
                                 self.direction.y = 0
                         
-    def update_timers(self):
-        for timer in self.timers.values():
-            timer.update()
-
     def animate(self, dt):
         '''
         Обрабатывает анимацию игрока в зависимости от его состояния.
@@ -213,8 +289,8 @@ class Player(pygame.sprite.Sprite):
         self.frame_index += ANIMATION_SPEED * dt
         if self.state == 'Attack1' and self.frame_index >= len(self.frames[self.state]):
             self.state = 'Idle'
-        self.image = self.frames[self.state][int(self.frame_index % len(self.frames[self.state]))]        
-        self.image = self.image if self.facing_right else pygame.transform.flip(self.image, flip_x = True, flip_y = False)
+        frames = self.frames if self.facing_right else self.flipped_frames
+        self.image = frames[self.state][int(self.frame_index % len(frames[self.state]))]
 
         if self.attacking and self.frame_index > len(self.frames[self.state]):
             self.attacking = False
@@ -251,9 +327,33 @@ class Player(pygame.sprite.Sprite):
             print(self.data.health)
             self.timers['hit'].activate()
 
+    def snapshot(self):
+        '''
+        Возвращает состояние игрока для снимка уровня: положение, скорость, анимацию, касания и таймеры.
+        '''
+        return (self.hitbox_rect.copy(), self.old_rect.copy(), self.direction.copy(), self.facing_right,
+                self.state, self.frame_index, self.attacking, self.damaged, dict(self.on_surface), self.platform,
+                {name: timer.snapshot() for name, timer in self.timers.items()})
+
+    def restore(self, state):
+        '''
+        Восстанавливает состояние игрока из snapshot.
+        '''
+        hitbox_rect, old_rect, direction, self.facing_right, self.state, self.frame_index, \
+            self.attacking, self.damaged, on_surface, self.platform, timers = state
+        self.hitbox_rect.update(hitbox_rect)
+        self.old_rect = old_rect.copy()
+        self.direction.update(direction)
+        self.on_surface.update(on_surface)
+        self.jump = False
+        for name, elapsed in timers.items():
+            self.timers[name].restore(elapsed)
+        self.rect.center = self.hitbox_rect.center
+        frames = self.frames if self.facing_right else self.flipped_frames
+        self.image = frames[self.state][int(self.frame_index % len(frames[self.state]))]
+
     def update(self, dt):
         self.old_rect = self.hitbox_rect.copy()
-        self.update_timers()
         
         self.input()
         self.move(dt)
@@ -0,0 +1,130 @@
+from settings import *
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+import json, csv
+
+class Section:
+    '''
+    Замер одной фазы кадра. Объект создается один раз на фазу и переиспользуется в каждом кадре.
+    '''
+    __slots__ = ('samples', 'start')
+
+    def __init__(self, window):
+        self.samples = deque(maxlen = window) # длительности последних замеров в секундах
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.samples.append(perf_counter() - self.start)
+        return False
+
+class Profiler:
+    '''
+    Класс Profiler замеряет время фаз кадра (обновление уровня, столкновения, отрисовка, интерфейс)
+    и хранит последние замеры каждой фазы для подсчета перцентилей.
+    Пока профайлер выключен, section возвращает один и тот же пустой контекст, и замеры почти ничего не стоят.
+    '''
+    def __init__(self, window = PROFILER_WINDOW):
+        '''
+        :param window: Сколько последних замеров каждой фазы учитывать в статистике.
+        :type window: int
+        '''
+        self.window = window
+        self.enabled = False
+        self.sections = {} # имя фазы -> Section, в порядке первого замера
+        self.null_section = nullcontext()
+        self.overlay = None # поверхность с таблицей статистики
+        self.overlay_time = 0 # когда таблица была построена
+
+    def section(self, name):
+        '''
+        Возвращает контекст для замера фазы: with profiler.section('level.update'): ...
+
+        :param name: Имя фазы. Вложенные фазы принято называть через точку.
+        :type name: str
+        '''
+        if not self.enabled:
+            return self.null_section
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = Section(self.window)
+        return section
+
+    def toggle(self):
+        '''
+        Включает или выключает сбор замеров и оверлей.
+        '''
+        self.enabled = not self.enabled
+        self.overlay = None
+
+    def reset(self):
+        self.sections.clear()
+        self.overlay = None
+
+    def stats(self):
+        '''
+        Возвращает статистику по каждой фазе в миллисекундах.
+
+        :return: Словарь имя фазы -> {'count', 'mean', 'p50', 'p95', 'p99', 'max'}.
+        :rtype: dict
+        '''
+        stats = {}
+        for name, section in self.sections.items():
+            samples = sorted(section.samples)
+            if not samples:
+                continue
+            last = len(samples) - 1
+            stats[name] = {
+                'count': len(samples),
+                'mean': sum(samples) / len(samples) * 1000,
+                'p50': samples[round(last * 0.50)] * 1000,
+                'p95': samples[round(last * 0.95)] * 1000,
+                'p99': samples[round(last * 0.99)] * 1000,
+                'max': samples[-1] * 1000}
+        return stats
+
+    def export(self, path):
+        '''
+        Сохраняет статистику в файл: CSV, если путь заканчивается на .csv, иначе JSON.
+
+        :param path: Путь к файлу.
+        :type path: str
+        '''
+        stats = self.stats()
+        with open(path, 'w', newline = '') as file:
+            if path.endswith('.csv'):
+                writer = csv.writer(file)
+                writer.writerow(['section', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+                for name, values in stats.items():
+                    writer.writerow([name, values['count']] + [f"{values[key]:.4f}" for key in ('mean', 'p50', 'p95', 'p99', 'max')])
+            else:
+                json.dump({'window': self.window, 'sections': stats}, file, indent = 2)
+
+    def draw(self, surface, font):
+        '''
+        Рисует в правом верхнем углу таблицу p50/p95/p99 по фазам.
+        Таблица строится заново не чаще двух раз в секунду, чтобы сам оверлей не влиял на замеры.
+
+        :param surface: Поверхность экрана.
+        :type surface: pygame.Surface
+        :param font: Шрифт таблицы.
+        :type font: pygame.font.Font
+        '''
+        now = perf_counter()
+        if self.overlay is None or now - self.overlay_time > 0.5:
+            lines = [f"{'ms':<24}{'p50':>7}{'p95':>7}{'p99':>7}"]
+            lines += [f"{name:<24}{values['p50']:>7.2f}{values['p95']:>7.2f}{values['p99']:>7.2f}" for name, values in self.stats().items()]
+            surfs = [font.render(line, False, 'white') for line in lines]
+            line_height = font.get_linesize()
+            self.overlay = pygame.Surface((max(surf.get_width() for surf in surfs) + 8, line_height * len(surfs) + 8), pygame.SRCALPHA)
+            self.overlay.fill((0, 0, 0, 160))
+            for number, surf in enumerate(surfs):
+                self.overlay.blit(surf, (4, 4 + number * line_height))
+            self.overlay_time = now
+        surface.blit(self.overlay, self.overlay.get_rect(topright = (surface.get_width() - 5, 5)))
+
+profiler = Profiler()
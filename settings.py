@@ -4,6 +4,21 @@ from pygame.math import Vector2 as vector
 WIN_WIDTH, WIN_HEIGHT = 800, 400
 TILE_SIZE = 32
 ANIMATION_SPEED = 6
+FPS = 60 # ограничение частоты отрисовки, 0 - без ограничения
+FIXED_DT = 1 / 120 # фиксированный шаг симуляции в секундах
+MAX_STEPS = 8 # сколько шагов симуляции можно догнать за один кадр
+ATLAS_SIZE = 1024 # размер страницы атласа текстур в пикселях
+CACHE_FOLDER = 'Assets/cache' # атлас и декодированные изображения
+IMAGE_CACHE_FOLDER = 'Assets/cache/images' # пиксели изображений без PNG-сжатия, по хешу пути и содержимого файла
+MAP_CACHE_SIZE = 2 # сколько разобранных карт (не созданных уровней) LevelLoader держит в памяти
+CHUNK_SIZE = 512 # размер чанка статичных слоев в пикселях
+CELL_SIZE = 128 # размер ячейки сетки, по которой камера ищет видимые спрайты
+ACTIVATION_MARGIN = 256 # насколько за краем экрана спрайты и враги еще обновляются, в пикселях
+CHECKPOINT_INTERVAL = 1 # как часто уровень сохраняет снимок для возрождения и перемотки, в секундах
+CHECKPOINT_COUNT = 30 # сколько последних снимков хранится
+BACKGROUND_COLOR = (44, 156, 213) # цвет неба за тайлами
+PARTICLE_POOL_SIZE = 32 # сколько частиц создается заранее
+PROFILER_WINDOW = 600 # по скольким последним кадрам профайлер считает перцентили
 
 Z_LAYERS = {
     'background': 0,
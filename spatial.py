@@ -0,0 +1,104 @@
+from settings import *
+from math import floor
+
+class SpatialGrid:
+    '''
+    Класс SpatialGrid - равномерная сетка для быстрого поиска объектов по прямоугольнику.
+    Каждый объект хранится во всех ячейках, которые покрывает его прямоугольник, поэтому запрос
+    просматривает только ячейки вокруг искомой области, а не все объекты уровня.
+    '''
+    def __init__(self, cell_size):
+        '''
+        :param cell_size: Размер ячейки сетки в пикселях.
+        :type cell_size: int
+        '''
+        self.cell_size = cell_size
+        self.cells = {} # (cx, cy) -> объекты ячейки (dict используется как упорядоченное множество)
+        self.spans = {} # объект -> диапазон занятых ячеек
+        self.order = {} # объект -> порядковый номер добавления
+        self.counter = 0
+
+    def __contains__(self, item):
+        return item in self.spans
+
+    def __len__(self):
+        return len(self.spans)
+
+    def span(self, rect):
+        '''
+        Возвращает диапазон ячеек (left, top, right, bottom), которые покрывает прямоугольник.
+        Прямоугольники с отрицательной шириной или высотой нормализуются.
+        '''
+        left, right = sorted((rect.left, rect.right))
+        top, bottom = sorted((rect.top, rect.bottom))
+        size = self.cell_size
+        return floor(left / size), floor(top / size), floor(right / size), floor(bottom / size)
+
+    def link(self, item, span):
+        left, top, right, bottom = span
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                if (cx, cy) not in self.cells:
+                    self.cells[(cx, cy)] = {}
+                self.cells[(cx, cy)][item] = None
+        self.spans[item] = span
+
+    def unlink(self, item):
+        left, top, right, bottom = self.spans.pop(item)
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                cell = self.cells[(cx, cy)]
+                del cell[item]
+                if not cell:
+                    del self.cells[(cx, cy)]
+
+    def insert(self, item, rect):
+        '''
+        Добавляет объект в сетку.
+
+        :param item: Объект (обычно спрайт).
+        :param rect: Прямоугольник объекта.
+        :type rect: pygame.FRect
+        '''
+        if item in self.spans:
+            self.unlink(item)
+        else:
+            self.order[item] = self.counter
+            self.counter += 1
+        self.link(item, self.span(rect))
+
+    def remove(self, item):
+        '''
+        Удаляет объект из сетки, если он в ней есть.
+        '''
+        if item in self.spans:
+            self.unlink(item)
+            del self.order[item]
+
+    def move(self, item, rect):
+        '''
+        Перекладывает объект в другие ячейки, только если после перемещения изменился их диапазон.
+        '''
+        span = self.span(rect)
+        if self.spans[item] != span:
+            self.unlink(item)
+            self.link(item, span)
+
+    def query(self, rect):
+        '''
+        Возвращает объекты из ячеек, которые покрывает прямоугольник, в порядке их добавления.
+        Это кандидаты: точную проверку пересечения выполняет вызывающий код.
+
+        :param rect: Прямоугольник запроса.
+        :type rect: pygame.FRect
+        :return: Список объектов.
+        :rtype: list
+        '''
+        left, top, right, bottom = self.span(rect)
+        found = {}
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                cell = self.cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        return sorted(found, key = self.order.__getitem__)
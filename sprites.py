@@ -36,6 +36,12 @@ class AnimatedSprite(Sprite):
     def animate(self, dt):
         self.frame_index += self.animation_speed * dt
         self.image = self.frames[int(self.frame_index % len(self.frames))]
+
+    def fast_forward(self, elapsed):
+        '''
+        Догоняет время, которое спрайт проспал вне активной области (см. AllSprites.update).
+        '''
+        self.animate(elapsed)
     
     def update(self, dt):
         self.animate(dt)
@@ -62,26 +68,6 @@ class Item(AnimatedSprite):
         if self.item_type == 'potion':
             self.data.health += 1
 
-class ParticleEffectSprite(AnimatedSprite):
-    '''
-    Класс для эффектов частиц в игре.
-
-    Аргументы:
-    - pos (tuple): Начальная позиция эффекта (x, y).
-    - frames (list): Список кадров анимации.
-    - groups (list): Список групп спрайтов, к которым принадлежит этот эффект.
-    '''
-    def __init__(self, pos, frames, groups):
-        super().__init__(pos, frames, groups)
-        self.z = Z_LAYERS['frontground']
-
-    def animate(self, dt):
-        self.frame_index += self.animation_speed * dt
-        if self.frame_index < len(self.frames):
-            self.image = self.frames[int(self.frame_index)]
-        else:
-            self.kill()
-
 class MovingSprite(AnimatedSprite):
     '''
     Класс для движущихся спрайтов.
@@ -102,6 +88,14 @@ class MovingSprite(AnimatedSprite):
             self.rect.midtop = start_pos
         self.start_pos = start_pos
         self.end_pos = end_pos
+
+        # вся область, которую спрайт проходит между start_pos и end_pos: по ней группа будит спящий спрайт
+        end_rect = self.rect.copy()
+        if move_dir == 'x':
+            end_rect.right = end_pos[0]
+        else:
+            end_rect.bottom = end_pos[1]
+        self.path_rect = self.rect.union(end_rect)
         
         # движение
         self.moving = True
@@ -128,24 +122,48 @@ class MovingSprite(AnimatedSprite):
                 self.direction.y = 1
                 self.rect.top = self.start_pos[1]
 
+    def fast_forward(self, elapsed):
+        '''
+        Переносит спрайт туда, где он оказался бы через elapsed секунд: движение между start_pos и end_pos
+        периодично, поэтому позиция считается сразу, без пошаговой симуляции.
+        '''
+        axis = 0 if self.move_dir == 'x' else 1
+        size = self.rect.size[axis]
+        span = self.end_pos[axis] - self.start_pos[axis] - size # сколько проходит край спрайта в одну сторону
+        if span > 0:
+            position = self.rect.topleft[axis] - self.start_pos[axis]
+            # путь туда и обратно разворачивается в отрезок длиной 2 * span
+            unfolded = position if self.direction[axis] > 0 else 2 * span - position
+            unfolded = (unfolded + self.speed * elapsed) % (2 * span)
+            forward = unfolded <= span
+            position = unfolded if forward else 2 * span - unfolded
+            if axis == 0:
+                self.rect.left = self.start_pos[0] + position
+                self.direction.x = 1 if forward else -1
+            else:
+                self.rect.top = self.start_pos[1] + position
+                self.direction.y = 1 if forward else -1
+        self.old_rect = self.rect.copy()
+        self.animate(elapsed)
+
+    def snapshot(self):
+        '''
+        Возвращает положение, направление и кадр анимации для снимка уровня.
+        '''
+        return self.rect.topleft, self.direction.copy(), self.frame_index
+
+    def restore(self, state):
+        '''
+        Восстанавливает состояние из snapshot.
+        '''
+        self.rect.topleft, direction, self.frame_index = state
+        self.direction.update(direction)
+        self.old_rect = self.rect.copy()
+        self.animate(0)
+
     def update(self, dt):
         self.old_rect = self.rect.copy()
         self.rect.topleft += self.direction * self.speed * dt
         self.check_border()
 
         self.animate(dt)
-
-# UI
-class Heart(AnimatedSprite):
-    '''
-    Класс для спрайтов сердец, отображающих здоровье игрока.
-
-    Аргументы:
-    - pos (tuple): Начальная позиция сердечка (x, y).
-    - frames (list): Список кадров анимации.
-    - groups (list): Список групп спрайтов, к которым принадлежит это сердечко.
-    '''
-    def __init__(self, pos, frames, groups):
-        super().__init__(pos, frames, groups)
-        self.active = False
-    
\ No newline at end of file
@@ -1,8 +1,101 @@
 from settings import * 
-from os import walk
-from os.path import join
+from os import walk, makedirs, replace, remove, fdopen
+from os.path import join, normpath
+from glob import glob
+from tempfile import mkstemp
+from io import BytesIO
+from hashlib import sha1
+from struct import Struct
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-def import_image(*path, alpha = True, format = 'png'):
+RAW_HEADER = Struct('<4sII') # magic, ширина, высота; дальше пиксели RGBA
+RAW_MAGIC = b'PBRW'
+
+def convert_image(surf, alpha = True):
+	'''
+    Переводит изображение в формат экрана для быстрой отрисовки.
+    Без окна (в headless-режиме) конвертировать не во что, и изображение возвращается как есть.
+
+    Аргументы:
+    surf (pygame.Surface): Исходное изображение.
+    alpha (bool): Сохранять ли альфа-канал. По умолчанию True.
+
+    Возвращает:
+    pygame.Surface: Конвертированное изображение.
+    '''
+	if not pygame.display.get_surface():
+		return surf
+	return surf.convert_alpha() if alpha else surf.convert()
+
+def decode_image(path, cache_folder = IMAGE_CACHE_FOLDER):
+	'''
+    Декодирует изображение без конвертации под формат экрана, поэтому может вызываться из любого потока.
+    Если задана папка кеша, пиксели сохраняются в нее несжатыми под именем из хеша пути и хеша содержимого файла,
+    и при следующих запусках PNG не распаковывается. Когда файл меняется, прежняя запись этого пути удаляется.
+
+    Аргументы:
+    path (str): Путь к изображению.
+    cache_folder (str): Папка кеша или None, чтобы не использовать кеш. По умолчанию IMAGE_CACHE_FOLDER.
+
+    Возвращает:
+    pygame.Surface: Декодированное изображение.
+    '''
+	with open(path, 'rb') as file:
+		data = file.read()
+	if not cache_folder:
+		return pygame.image.load(BytesIO(data), path)
+
+	path_key = sha1(normpath(path).encode()).hexdigest()[:16]
+	raw_path = join(cache_folder, f'{path_key}-{sha1(data).hexdigest()}.raw')
+	try:
+		with open(raw_path, 'rb') as file:
+			raw = file.read()
+		magic, width, height = RAW_HEADER.unpack_from(raw)
+		if magic == RAW_MAGIC and len(raw) == RAW_HEADER.size + width * height * 4:
+			return pygame.image.frombytes(raw[RAW_HEADER.size:], (width, height), 'RGBA')
+	except (OSError, ValueError):
+		pass
+
+	surf = pygame.image.load(BytesIO(data), path)
+	try:
+		# записи прежних версий этого файла больше не понадобятся
+		for stale_path in glob(join(cache_folder, f'{path_key}-*.raw')):
+			remove(stale_path)
+		makedirs(cache_folder, exist_ok = True)
+		# запись через временный файл с уникальным именем, чтобы другой поток или процесс
+		# (например, соседняя среда VectorEnv) не прочитал недописанный кеш и не писал в тот же файл
+		handle, temp_path = mkstemp(suffix = '.tmp', dir = cache_folder)
+		try:
+			with fdopen(handle, 'wb') as file:
+				file.write(RAW_HEADER.pack(RAW_MAGIC, *surf.get_size()) + pygame.image.tobytes(surf, 'RGBA'))
+			replace(temp_path, raw_path)
+		except OSError:
+			remove(temp_path)
+			raise
+	except OSError:
+		pass
+	return surf
+
+def decode_images(paths, cache_folder = IMAGE_CACHE_FOLDER, workers = None):
+	'''
+    Декодирует несколько изображений параллельно в пуле потоков: распаковка PNG отпускает GIL.
+    Конвертацию под формат экрана вызывающий код выполняет сам, в основном потоке.
+
+    Аргументы:
+    paths (list): Пути к изображениям.
+    cache_folder (str): Папка кеша декодированных пикселей или None. По умолчанию IMAGE_CACHE_FOLDER.
+    workers (int): Количество потоков; 1 - последовательная загрузка. По умолчанию по числу ядер.
+
+    Возвращает:
+    list: Изображения в том же порядке, что и пути.
+    '''
+	if workers == 1 or len(paths) < 2:
+		return [decode_image(path, cache_folder) for path in paths]
+	with ThreadPoolExecutor(workers) as executor:
+		return list(executor.map(partial(decode_image, cache_folder = cache_folder), paths))
+
+def import_image(*path, alpha = True, format = 'png', atlas = None):
 	'''
     Импортирует изображение из указанного пути и преобразует его в формат, подходящий для pygame.
 
@@ -12,37 +105,43 @@ def import_image(*path, alpha = True, format = 'png'):
                   Если False, изображение будет преобразовано без учета альфа-канала.
                   По умолчанию True.
     format (str): Формат изображения (например, 'png', 'jpg'). По умолчанию 'png'.
+    atlas (TextureAtlas): Атлас, из которого берется изображение, если оно в него упаковано. По умолчанию None.
 
     Возвращает:
     pygame.Surface: Загруженное и преобразованное изображение.
     '''
 	full_path = join(*path) + f'.{format}'
-	return pygame.image.load(full_path).convert_alpha() if alpha else pygame.image.load(full_path).convert()
+	if alpha and atlas and full_path in atlas:
+		return atlas[full_path]
+	return convert_image(decode_image(full_path), alpha)
 
-def import_folder(*path):
+def import_folder(*path, atlas = None):
 	'''
     Импортирует все изображения из указанной папки и возвращает их в виде списка.
 
     Аргументы:
     *path (str): Переменное количество аргументов, представляющих путь к папке с изображениями.
+    atlas (TextureAtlas): Атлас, из которого берутся упакованные в него кадры. По умолчанию None.
 
     Возвращает:
     list: Список загруженных и преобразованных изображений.
     '''
-	frames = []
+	full_paths = []
 	for folder_path, sub_folders, image_names in walk(join(*path)):
 		for image_name in sorted(image_names, key = lambda name: int(name.split('.')[0])):
-			full_path = join(folder_path, image_name)
-			frames.append(pygame.image.load(full_path).convert_alpha())
-	return frames 
+			full_paths.append(join(folder_path, image_name))
+	if atlas and all(full_path in atlas for full_path in full_paths):
+		return [atlas[full_path] for full_path in full_paths]
+	return [convert_image(surf) for surf in decode_images(full_paths)]
 
-def import_sub_folders(*path):
+def import_sub_folders(*path, atlas = None):
 	'''
     Импортирует изображения из всех подпапок указанной директории и возвращает их в виде словаря,
     где ключами являются имена подпапок.
 
     Аргументы:
     *path (str): Переменное количество аргументов, представляющих путь к директории с подпапками.
+    atlas (TextureAtlas): Атлас, из которого берутся упакованные в него кадры. По умолчанию None.
 
     Возвращает:
     dict: Словарь, где ключи — имена подпапок, а значения — списки загруженных и преобразованных изображений.
@@ -51,5 +150,23 @@ def import_sub_folders(*path):
 	for folder_path, sub_folders, image_names in walk(join(*path)): 
 		if sub_folders:
 			for sub_folder in sub_folders:
-				frame_dict[sub_folder] = import_folder(*path, sub_folder)
-	return frame_dict
\ No newline at end of file
+				frame_dict[sub_folder] = import_folder(*path, sub_folder, atlas = atlas)
+	return frame_dict
+
+def flip_frames(frames, atlas = None):
+	'''
+    Создает отраженные по горизонтали копии кадров, сохраняя структуру (словари и списки любой вложенности).
+    Используется один раз при загрузке, чтобы спрайты не вызывали pygame.transform.flip в каждом кадре.
+
+    Аргументы:
+    frames (dict | list | pygame.Surface): Кадры для отражения.
+    atlas (TextureAtlas): Атлас, в котором отражается страница целиком вместо отдельных кадров. По умолчанию None.
+
+    Возвращает:
+    dict | list | pygame.Surface: Отраженные кадры той же структуры.
+    '''
+	if isinstance(frames, dict):
+		return {key: flip_frames(value, atlas) for key, value in frames.items()}
+	if isinstance(frames, list):
+		return [flip_frames(frame, atlas) for frame in frames]
+	return atlas.flip(frames) if atlas else pygame.transform.flip(frames, True, False)
\ No newline at end of file
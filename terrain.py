@@ -0,0 +1,149 @@
+from settings import *
+from math import floor, ceil
+import numpy as np
+
+class TerrainGrid:
+    '''
+    Класс TerrainGrid - карта занятости тайлов слоя Terrain: по одному флагу на тайл уровня.
+    Проверка точки или прямоугольника смотрит только в нужные ячейки массива, не перебирая спрайты.
+    Для столкновений соседние тайлы объединяются жадным алгоритмом в крупные прямоугольники (блоки):
+    ровный пол из 50 тайлов - это один прямоугольник, и на стыках тайлов игрок не цепляется.
+    '''
+    def __init__(self, width, height):
+        '''
+        :param width: Ширина уровня в тайлах.
+        :type width: int
+        :param height: Высота уровня в тайлах.
+        :type height: int
+        '''
+        self.width, self.height = width, height
+        self.solid = np.zeros((height, width), bool) # [строка, столбец]
+        self.padded = None # копия solid с пустой рамкой в один тайл для векторных проверок
+        self.blocks = None # прямоугольники объединенных тайлов, строятся при первом запросе
+        self.block_index = None # [строка, столбец] -> номер блока, которому принадлежит тайл, или -1
+
+    def add(self, x, y):
+        '''
+        Отмечает тайл как занятый.
+
+        :param x: Столбец тайла.
+        :type x: int
+        :param y: Строка тайла.
+        :type y: int
+        '''
+        self.solid[y, x] = True
+        self.padded = self.blocks = self.block_index = None
+
+    def tile_range(self, rect):
+        '''
+        Возвращает диапазон тайлов (left, top, right, bottom) включительно, которые строго пересекаются
+        с прямоугольником, как в colliderect: касание краем пересечением не считается.
+        Диапазон обрезается по границам уровня и может оказаться пустым (right < left или bottom < top).
+        '''
+        left, right = sorted((rect.left, rect.right))
+        top, bottom = sorted((rect.top, rect.bottom))
+        return (max(floor(left / TILE_SIZE), 0), max(floor(top / TILE_SIZE), 0),
+                min(ceil(right / TILE_SIZE) - 1, self.width - 1), min(ceil(bottom / TILE_SIZE) - 1, self.height - 1))
+
+    def solid_at(self, x, y):
+        '''
+        Проверяет, занят ли тайл, в который попадает точка (x, y) в пикселях. За пределами уровня тайлов нет.
+
+        :rtype: bool
+        '''
+        column, row = floor(x / TILE_SIZE), floor(y / TILE_SIZE)
+        return 0 <= column < self.width and 0 <= row < self.height and bool(self.solid[row, column])
+
+    def solid_box(self, rect):
+        '''
+        Проверяет, пересекается ли прямоугольник хотя бы с одним занятым тайлом.
+
+        :param rect: Прямоугольник в пикселях.
+        :type rect: pygame.Rect | pygame.FRect
+        :rtype: bool
+        '''
+        if not rect.width or not rect.height:
+            return False
+        left, top, right, bottom = self.tile_range(rect)
+        return right >= left and bottom >= top and bool(self.solid[top:bottom + 1, left:right + 1].any())
+
+    def merge(self):
+        '''
+        Объединяет занятые тайлы в прямоугольные блоки жадным алгоритмом: от верхнего левого свободного тайла
+        блок растягивается вправо, пока идут занятые тайлы, а затем вниз, пока следующая строка занята на всю его ширину.
+        Блоки нумеруются в порядке их верхних левых углов, построчно.
+        '''
+        self.blocks = []
+        self.block_index = np.full(self.solid.shape, -1, np.int32)
+        free = self.solid.copy() # занятые тайлы, еще не попавшие ни в один блок
+        for top in range(self.height):
+            for left in np.flatnonzero(free[top]).tolist():
+                if not free[top, left]:
+                    continue # тайл забрал блок, начатый левее в этой же строке
+                right = left + 1
+                while right < self.width and free[top, right]:
+                    right += 1
+                bottom = top + 1
+                while bottom < self.height and free[bottom, left:right].all():
+                    bottom += 1
+                free[top:bottom, left:right] = False
+                self.block_index[top:bottom, left:right] = len(self.blocks)
+                self.blocks.append(pygame.FRect(left * TILE_SIZE, top * TILE_SIZE, (right - left) * TILE_SIZE, (bottom - top) * TILE_SIZE))
+
+    def rects(self, rect):
+        '''
+        Возвращает блоки столкновений, пересекающиеся с rect, в порядке их номеров (сверху вниз, слева направо).
+
+        :param rect: Область запроса.
+        :type rect: pygame.FRect
+        :rtype: list
+        '''
+        if self.blocks is None:
+            self.merge()
+        left, top, right, bottom = self.tile_range(rect)
+        if right < left or bottom < top:
+            return []
+        numbers = np.unique(self.block_index[top:bottom + 1, left:right + 1])
+        return [self.blocks[number] for number in numbers.tolist() if number >= 0]
+
+    def probe(self, x, y):
+        '''
+        Векторная проверка щупов 1x1 с верхними левыми углами (x, y): для каждого щупа True,
+        если он строго пересекается хотя бы с одним занятым тайлом. Щуп на стыке задевает до четырех тайлов.
+        Координаты передаются в float32, как в pygame.FRect, чтобы граничные случаи совпадали с colliderect.
+
+        :param x: Массив координат x.
+        :type x: numpy.ndarray
+        :param y: Массив координат y.
+        :type y: numpy.ndarray
+        :rtype: numpy.ndarray
+        '''
+        if self.padded is None:
+            self.padded = np.pad(self.solid, 1)
+        one = np.float32(1)
+        left = np.floor(x / TILE_SIZE).astype(np.int64)
+        right = np.ceil((x + one) / TILE_SIZE).astype(np.int64) - 1
+        top = np.floor(y / TILE_SIZE).astype(np.int64)
+        bottom = np.ceil((y + one) / TILE_SIZE).astype(np.int64) - 1
+
+        # сдвиг на рамку и обрезка: все, что за пределами уровня, попадает в пустую рамку
+        rows, columns = self.padded.shape
+        left, right = np.clip(left + 1, 0, columns - 1), np.clip(right + 1, 0, columns - 1)
+        top, bottom = np.clip(top + 1, 0, rows - 1), np.clip(bottom + 1, 0, rows - 1)
+        solid = self.padded
+        return solid[top, left] | solid[top, right] | solid[bottom, left] | solid[bottom, right]
+
+    def row_runs(self):
+        '''
+        Объединяет подряд идущие занятые тайлы каждой строки в один прямоугольник.
+
+        :return: Прямоугольники отрезков в пикселях, построчно.
+        :rtype: list
+        '''
+        runs = []
+        for row in range(self.height):
+            # границы отрезков - места, где флаг меняется
+            edges = np.flatnonzero(np.diff(np.concatenate(([False], self.solid[row], [False])).astype(np.int8)))
+            runs += [pygame.FRect(start * TILE_SIZE, row * TILE_SIZE, (end - start) * TILE_SIZE, TILE_SIZE)
+                     for start, end in zip(edges[::2].tolist(), edges[1::2].tolist())]
+        return runs
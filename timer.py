@@ -1,11 +1,66 @@
+from heapq import heappush, heappop
 from pygame.time import get_ticks
 
+class SimulationClock:
+	'''
+	Часы времени симуляции и планировщик таймеров. В отличие от pygame.time.get_ticks() идут только тогда, когда уровень делает шаг,
+	поэтому таймеры ведут себя одинаково при любой частоте кадров, в headless-режиме и при воспроизведении реплея.
+
+	Часы принадлежат владельцу таймеров: у каждого уровня свои часы, у интерфейса - свои,
+	поэтому уровни и среды в одном процессе не делят время и очередь таймеров.
+
+	Активные таймеры лежат в куче по времени срабатывания. За шаг просматриваются только истекшие таймеры,
+	поэтому стоимость шага не зависит от того, сколько таймеров создано.
+	'''
+	def __init__(self):
+		self.ticks = 0
+		self.queue = [] # куча (время срабатывания, порядковый номер, таймер, поколение таймера)
+		self.counter = 0
+
+	def advance(self, dt):
+		'''
+		Продвигает время симуляции и срабатывает таймеры, время которых истекло.
+
+		:param dt: Длительность шага в секундах.
+		:type dt: float
+		'''
+		self.ticks += dt * 1000
+		queue = self.queue
+		while queue:
+			deadline, number, timer, generation = queue[0]
+			if timer.generation != generation:
+				heappop(queue) # таймер перезапущен или остановлен, запись устарела
+			elif self.ticks - timer.start_time >= timer.duration:
+				heappop(queue)
+				timer.expire()
+			else:
+				break
+
+	def schedule(self, timer):
+		'''
+		Ставит запущенный таймер в очередь. Прежние записи этого таймера отбрасываются по номеру поколения.
+
+		:param timer: Таймер.
+		:type timer: Timer
+		'''
+		heappush(self.queue, (timer.start_time + timer.duration, self.counter, timer, timer.generation))
+		self.counter += 1
+
+	def get_ticks(self):
+		'''
+		Возвращает время симуляции в миллисекундах.
+		'''
+		return self.ticks
+
 class Timer:
 	'''
 	Класс для создания таймеров, которые могут выполнять определенные действия через заданный промежуток времени.
     Таймер может быть одноразовым или повторяющимся.
+	Таймер с часами симуляции не нужно опрашивать: при запуске он встает в очередь часов, и флаг active
+	сбрасывается, когда часы доходят до его времени срабатывания. Таймер без часов, как и раньше,
+	идет по pygame.time.get_ticks() и проверяется вызовом update в основном цикле.
 	'''
-	def __init__(self, duration, func = None, repeat = False):
+	def __init__(self, duration, func = None, repeat = False, clock = None):
 		'''
         Инициализирует таймер.
 
@@ -15,19 +70,28 @@ class Timer:
         :type func: function
         :param repeat: Флаг, указывающий, должен ли таймер повторяться. По умолчанию False.
         :type repeat: bool
+        :param clock: Часы симуляции, по которым идет таймер. По умолчанию None - реальное время pygame.
+        :type clock: SimulationClock
         '''
 		self.duration = duration
+		self.clock = clock
 		self.func = func
 		self.start_time = 0
 		self.active = False
 		self.repeat = repeat
+		self.generation = 0 # меняется при каждом запуске и остановке, чтобы старые записи в очереди игнорировались
 
 	def activate(self):
 		'''
         Активирует таймер. Устанавливает флаг `active` в `True` и записывает текущее время в `start_time`.
         '''
 		self.active = True
-		self.start_time = get_ticks()
+		self.generation += 1
+		if self.clock is None:
+			self.start_time = get_ticks()
+		else:
+			self.start_time = self.clock.get_ticks()
+			self.clock.schedule(self)
 
 	def deactivate(self):
 		'''
@@ -36,16 +100,49 @@ class Timer:
 		'''
 		self.active = False
 		self.start_time = 0
+		self.generation += 1
 		if self.repeat:
 			self.activate()
 
 	def update(self):
 		'''
-		Вызывается в основном цикле игры, проверяет, истекло ли время таймера.
+		Вызывается в основном цикле игры для таймера без часов, проверяет, истекло ли время таймера.
         Если время истекло, выполняет заданную функцию (если есть) и деактивирует таймер.
+		Таймер с часами срабатывает сам, и для него метод ничего не делает.
 		'''
-		current_time = get_ticks()
-		if current_time - self.start_time >= self.duration:
+		if self.clock is None and get_ticks() - self.start_time >= self.duration:
 			if self.func and self.start_time != 0:
 				self.func()
-			self.deactivate()
\ No newline at end of file
+			self.deactivate()
+
+	def expire(self):
+		'''
+		Вызывается часами симуляции, когда время таймера истекло: выполняет заданную функцию (если есть) и деактивирует таймер.
+		'''
+		if self.func:
+			self.func()
+		self.deactivate()
+
+	def snapshot(self):
+		'''
+		Возвращает состояние таймера для снимка уровня: время запуска или None, если таймер не активен.
+		Время запуска отсчитывается по часам таймера, поэтому вместе со снимком сохраняются и показания этих часов.
+		'''
+		return self.start_time if self.active else None
+
+	def restore(self, start_time):
+		'''
+		Восстанавливает состояние таймера из snapshot. Функция таймера при этом не вызывается.
+
+		:param start_time: Время запуска или None для остановленного таймера.
+		:type start_time: float
+		'''
+		self.generation += 1
+		if start_time is None:
+			self.active = False
+			self.start_time = 0
+		else:
+			self.active = True
+			self.start_time = start_time
+			if self.clock is not None:
+				self.clock.schedule(self)
@@ -1,10 +1,13 @@
 from settings import *
-from sprites import Heart
-from timer import Timer
+from timer import Timer, SimulationClock
+from profiler import profiler
 
 class UI:
     '''
     Класс UI отвечает за отображение данных на экране, таких как количество монет и здоровье игрока.
+    Весь интерфейс рисуется в одну закешированную поверхность, которая перерисовывается только при изменениях:
+    новом значении здоровья или монет из Data, смене кадра анимации сердец или появлении и скрытии счетчика монет.
+    В остальных кадрах на экран выводится готовая поверхность одним blit.
     '''
     def __init__(self, font, frames):
         '''
@@ -15,42 +18,49 @@ class UI:
         - frames (dict): Словарь с изображениями для сердец и монет.
         '''
         self.display_surface = pygame.display.get_surface()
-        self.sprites = pygame.sprite.Group()
         self.font = font
+        self.text_surfs = {} # строка -> отрисованный текст
+        self.surface = None # закешированный интерфейс
+        self.dirty = True
+        self.changed = [] # области экрана, которые интерфейс занимал до и после перерисовки в последнем update
 
         # health
+        # все сердца анимируются синхронно, поэтому у них один общий индекс кадра
         self.heart_frames = frames['heart']
         self.heart_surf_width = self.heart_frames[0].get_width()
         self.heart_padding = 0
-        self.create_hearts(3)
+        self.heart_frame_index = 0
+        self.heart_frame = 0
+        self.show_health(3)
 
         # coins
         self.coin_amount = 0
-        self.coin_timer = Timer(1000)
+        self.clock = SimulationClock() # часы интерфейса идут в UI.update и не зависят от уровня
+        self.coin_timer = Timer(1000, clock = self.clock)
         self.coin_surf = frames['coin']
+        self.coins_visible = False
 
-    def create_hearts(self, amount):
+    def show_health(self, amount):
         '''
-        Создает и отображает на экране указанное количество сердец.
+        Обновляет количество сердец на экране. Анимация сердец начинается заново.
 
         Аргументы:
         - amount (int): Количество сердец для отображения.
         '''
-        for sprite in self.sprites:
-            sprite.kill()
-        for heart in range(amount):
-            x = 10 + heart * (self.heart_surf_width + self.heart_padding)
-            y = 10
-            Heart((x, y), self.heart_frames, self.sprites)
-
-    def display_text(self):
-        if self.coin_timer.active:
-            text_surf = self.font.render(str(self.coin_amount), False, 'white')
-            text_rect = text_surf.get_frect(topleft = (40, 50))
-            self.display_surface.blit(text_surf, text_rect)
-
-            coin_rect = self.coin_surf.get_frect(topleft = (5, 50))
-            self.display_surface.blit(self.coin_surf, coin_rect)
+        self.health = amount
+        self.heart_frame_index = 0
+        self.dirty = True
+
+    def render_text(self, text):
+        '''
+        Возвращает отрисованный текст. Каждая строка рендерится шрифтом только один раз.
+
+        Аргументы:
+        - text (str): Текст.
+        '''
+        if text not in self.text_surfs:
+            self.text_surfs[text] = self.font.render(text, False, 'white')
+        return self.text_surfs[text]
 
     def show_coins(self, amount):
         '''
@@ -61,9 +71,63 @@ class UI:
         '''
         self.coin_amount = amount
         self.coin_timer.activate()
+        self.dirty = True
+
+    def redraw(self):
+        '''
+        Перерисовывает закешированную поверхность интерфейса: сердца и, пока активен таймер, счетчик монет.
+        Поверхность покрывает только область, занятую интерфейсом, и создается заново лишь при изменении размера.
+        '''
+        heart_frame = self.heart_frames[self.heart_frame]
+        blits = [(heart_frame, (10 + heart * (self.heart_surf_width + self.heart_padding), 10)) for heart in range(self.health)]
+        if self.coins_visible:
+            blits.append((self.render_text(str(self.coin_amount)), (40, 50)))
+            blits.append((self.coin_surf, (5, 50)))
+
+        width = max((pos[0] + surf.get_width() for surf, pos in blits), default = 1)
+        height = max((pos[1] + surf.get_height() for surf, pos in blits), default = 1)
+        self.changed = [self.surface.get_rect()] if self.surface else []
+        if not self.surface or self.surface.get_size() != (width, height):
+            self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        else:
+            self.surface.fill((0, 0, 0, 0))
+        self.surface.blits(blits, False)
+        self.changed.append(self.surface.get_rect())
+        self.dirty = False
 
     def update(self, dt):
-        self.coin_timer.update()
-        self.sprites.update(dt)
-        self.sprites.draw(self.display_surface)
-        self.display_text()
\ No newline at end of file
+        self.changed = []
+        self.clock.advance(dt)
+        # анимация сердец: интерфейс перерисовывается только при смене кадра
+        self.heart_frame_index += ANIMATION_SPEED * dt
+        heart_frame = int(self.heart_frame_index % len(self.heart_frames))
+        if heart_frame != self.heart_frame:
+            self.heart_frame = heart_frame
+            self.dirty = self.dirty or self.health > 0
+        if self.coins_visible != self.coin_timer.active:
+            self.coins_visible = self.coin_timer.active
+            self.dirty = True
+
+        if self.dirty:
+            with profiler.section('ui.redraw'):
+                self.redraw()
+
+    def draw(self, rects = None):
+        '''
+        Выводит закешированный интерфейс на экран.
+
+        Аргументы:
+        - rects (list): Если заданы, интерфейс выводится только в эти области экрана (режим перерисовки изменений).
+        '''
+        with profiler.section('ui.draw'):
+            self.blit(rects)
+
+    def blit(self, rects):
+        if rects is None:
+            self.display_surface.blit(self.surface, (0, 0))
+            return
+        hud_rect = self.surface.get_rect()
+        for rect in rects:
+            area = rect.clip(hud_rect)
+            if area.width and area.height:
+                self.display_surface.blit(self.surface, area, area)